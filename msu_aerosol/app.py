@@ -5,12 +5,19 @@ from waitress import serve
 
 from msu_aerosol import config
 from msu_aerosol.admin import init_admin, init_schedule
-from msu_aerosol.commands import create_superuser
+from msu_aerosol.commands import (
+    build_rollups,
+    create_superuser,
+    migrate_storage,
+)
+from msu_aerosol.fragments import fragment_cache
+from msu_aerosol.jobs import job_queue
 from msu_aerosol.models import db
 from views.about import About
+from views.api import GraphSeries, JobStatus
 from views.archive import Archive, DeviceArchive
 from views.contacts import ACContacts, DevelopersContacts
-from views.graph import GraphDownload, GraphPage
+from views.graph import GraphDownload, GraphFragment, GraphPage
 from views.homepage import Home, UpdateIndex
 from views.users import Login, Logout, Profile, Register
 
@@ -22,6 +29,10 @@ app: Flask = config.initialize_flask_app(__name__)
 
 # Настройка приложения
 app.cli.add_command(create_superuser)
+app.cli.add_command(migrate_storage)
+app.cli.add_command(build_rollups)
+# Графики вставляются в страницы как готовый HTML, без компиляции Jinja
+app.add_template_global(fragment_cache.get, 'graph_fragment')
 
 logging.getLogger('waitress.queue').disabled = True
 
@@ -58,6 +69,18 @@ app.add_url_rule(
     '/graphs/<int:graph_id>/download',
     view_func=GraphDownload.as_view('graph_download'),
 )
+app.add_url_rule(
+    '/api/graphs/<int:graph_id>/series',
+    view_func=GraphSeries.as_view('graph_series'),
+)
+app.add_url_rule(
+    '/api/jobs/<int:job_id>',
+    view_func=JobStatus.as_view('job_status'),
+)
+app.add_url_rule(
+    '/graphs/<int:graph_id>/fragment/<any(full, recent):view>',
+    view_func=GraphFragment.as_view('graph_fragment'),
+)
 app.add_url_rule(
     '/profile',
     view_func=Profile.as_view('profile'),
@@ -85,6 +108,7 @@ with app.app_context():
     db.create_all()
     init_admin(app)
     init_schedule(None, None, None, app=app)
+    job_queue.start(app)
 
 
 def main() -> None:
@@ -0,0 +1,107 @@
+"""
+Нагрузочный замер скачивания данных приборов без сети.
+
+Создает синтетические приборы в локальном источнике и замеряет,
+сколько приборов в секунду проходят через опрос последнего файла
+(fetch_last_modified_file без обработки, как в задачах планировщика)
+и полную загрузку (download_device_data).
+
+Запуск из папки msu_aerosol:
+    python -m benchmarks.ingest --devices 300 --files 30 --latency 0.05
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from msu_aerosol import graph_funcs
+from msu_aerosol.sources import LocalDirectorySource, transfer
+
+__all__: list = []
+
+
+def make_devices(root: Path, devices: int, files: int, rows: int) -> None:
+    """
+    Создание папок синтетических приборов с суточными csv файлами.
+
+    :param root: Корень локального источника
+    :param devices: Число приборов
+    :param files: Число файлов у каждого прибора
+    :param rows: Число строк в каждом файле
+    """
+    for device in range(devices):
+        folder = root / f'device_{device}'
+        folder.mkdir(parents=True)
+        for day in range(files):
+            with (folder / f'2024_01_{day + 1:02d}.csv').open('w') as f:
+                f.write('Time;BC1;BC2\n')
+                f.writelines(
+                    f'2024-01-{day + 1:02d} {i // 3600:02d}:'
+                    f'{i // 60 % 60:02d}:{i % 60:02d};{i},5;{i % 7},25\n'
+                    for i in range(rows)
+                )
+
+
+async def download_all(names: list[str]) -> None:
+    await asyncio.gather(
+        *(graph_funcs.download_device_data(name, name) for name in names),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--failure-rate', type=float, default=0)
+    parser.add_argument('--workers', type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        root = Path(work) / 'source'
+        make_devices(root, args.devices, args.files, args.rows)
+        Path('schema').mkdir()
+        names = [f'device_{i}' for i in range(args.devices)]
+        for name in names:
+            Path(graph_funcs.main_path, name).mkdir(parents=True)
+        graph_funcs.source = LocalDirectorySource(
+            str(root),
+            latency=args.latency,
+            failure_rate=args.failure_rate,
+            seed=0,
+        )
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            fetched = list(
+                executor.map(
+                    graph_funcs.fetch_last_modified_file,
+                    names,
+                    names,
+                ),
+            )
+        elapsed = time.perf_counter() - start
+        ok = sum(i is not None for i in fetched)
+        print(
+            f'Опрос последнего файла: {ok}/{args.devices} приборов '
+            f'за {elapsed:.2f} с ({args.devices / elapsed:.1f} приборов/с)',
+        )
+
+        start = time.perf_counter()
+        transfer.run(download_all(names))
+        elapsed = time.perf_counter() - start
+        total = args.devices * args.files
+        print(
+            f'Полная загрузка: {total} файлов за {elapsed:.2f} с '
+            f'({total / elapsed:.1f} файлов/с)',
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Замер скорости proc_spaces на синтетических секундных данных
+в сравнении с прежней построчной реализацией.
+
+Прежняя реализация работает десятки секунд на каждые 100 тысяч строк,
+поэтому по умолчанию она замеряется на --legacy-rows строках,
+а ее время на --rows строках оценивается пропорционально.
+
+Запуск из папки msu_aerosol:
+    python -m benchmarks.proc_spaces --rows 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from msu_aerosol.graph_funcs import proc_spaces
+
+__all__: list = []
+
+
+def legacy_proc_spaces(df: pd.DataFrame, time_col: str) -> pd.DataFrame:
+    """
+    Прежняя реализация proc_spaces (цикл по строкам).
+    """
+    df = df.sort_values(by=time_col)
+    diff_mode = df[time_col].diff().mode().values[0] * 1.3
+    new_rows = []
+    for i in range(len(df) - 1):
+        diff = df.loc[i + 1, time_col] - df.loc[i, time_col]
+        if diff > diff_mode:
+            new_date1 = df.loc[i, time_col] + pd.Timedelta(seconds=1)
+            new_date2 = df.loc[i + 1, time_col] - pd.Timedelta(seconds=1)
+            new_rows.extend([{time_col: new_date1}, {time_col: new_date2}])
+    return pd.concat(
+        [df.T.drop_duplicates().T, pd.DataFrame(new_rows)],
+        ignore_index=True,
+    )
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """
+    Секундные данные аэталометра с часовым пропуском каждые 50000 строк.
+
+    :param rows: Число строк
+    """
+    rng = np.random.default_rng(0)
+    seconds = np.arange(rows) + np.arange(rows) // 50000 * 3600
+    timestamp = pd.Timestamp('2024-01-01') + pd.to_timedelta(
+        seconds,
+        unit='s',
+    )
+    return pd.DataFrame(
+        {
+            'Time': timestamp.strftime('%d.%m.%Y %H:%M:%S'),
+            'BC1': rng.random(rows) * 1000,
+            'BC2': rng.random(rows) * 1000,
+            'BCbb': rng.random(rows),
+            'timestamp': timestamp,
+        },
+    )
+
+
+def measure(func, df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    func(df, 'timestamp')
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--legacy-rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    new = measure(proc_spaces, make_frame(args.rows))
+    print(f'proc_spaces, {args.rows} строк: {new:.2f} с')
+
+    legacy_rows = min(args.legacy_rows, args.rows)
+    legacy = measure(legacy_proc_spaces, make_frame(legacy_rows))
+    estimated = legacy * args.rows / legacy_rows
+    print(
+        f'Прежняя реализация, {legacy_rows} строк: {legacy:.2f} с '
+        f'(на {args.rows} строк ~{estimated:.0f} с)',
+    )
+    print(f'Ускорение: ~{estimated / new:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
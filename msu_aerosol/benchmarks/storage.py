@@ -0,0 +1,75 @@
+"""
+Замер размера и скорости чтения одного файла-месяца
+в прежнем формате CSV и в Parquet.
+
+Запуск из папки msu_aerosol:
+    python -m benchmarks.storage --rows 45000 --columns 10
+"""
+
+import argparse
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from msu_aerosol.storage import read_partition, to_numeric, write_partition
+
+__all__: list = []
+
+
+def make_month(rows: int, columns: int) -> pd.DataFrame:
+    """
+    Минутные данные прибора за месяц: плавно меняющиеся
+    концентрации с точностью до 1 нг/м3, как у аэталометра.
+
+    :param rows: Число строк
+    :param columns: Число столбцов данных
+    """
+    rng = np.random.default_rng(0)
+    walk = np.cumsum(rng.normal(0, 5, (rows, columns)), axis=0)
+    df = pd.DataFrame(
+        np.abs(walk + 1000).round(0),
+        columns=[f'BC{i}' for i in range(columns)],
+    )
+    df.insert(
+        0,
+        'timestamp',
+        pd.date_range('2024-01-01', periods=rows, freq='60s'),
+    )
+    return df
+
+
+def measure(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=45_000)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_month(args.rows, args.columns)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir, '2024_01.csv')
+        parquet_path = Path(tmp_dir, '2024_01.parquet')
+        df.to_csv(csv_path, index=False)
+        write_partition(parquet_path, to_numeric(df))
+
+        for path in (csv_path, parquet_path):
+            seconds = measure(lambda: read_partition(path), args.repeat)
+            size = path.stat().st_size / 2**20
+            print(
+                f'{path.suffix[1:]:8} {size:7.2f} МБ, '
+                f'чтение {seconds * 1000:8.1f} мс',
+            )
+
+
+if __name__ == '__main__':
+    main()
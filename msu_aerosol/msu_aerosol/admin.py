@@ -1,4 +1,3 @@
-import asyncio
 import atexit
 import csv
 import os
@@ -6,6 +5,8 @@ from pathlib import Path
 import shutil
 from typing import Type
 
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask import Flask, request
 from flask_admin import Admin
@@ -13,17 +14,19 @@ from flask_admin import AdminIndexView, BaseView, expose
 from flask_login import current_user, LoginManager
 from sqlalchemy.event import listens_for
 
-from msu_aerosol.exceptions import (
-    ColumnsMatchError,
-    TimeFormatError,
+from msu_aerosol.config import download_concurrency, poll_jitter
+from msu_aerosol.fragments import (
+    find_fragment,
+    page_views,
+    remove_fragment,
+    views,
 )
 from msu_aerosol.graph_funcs import (
     download_device_data,
-    download_last_modified_file,
     get_spaced_colors,
-    make_graph,
-    preprocess_device_data,
+    refresh_device,
 )
+from msu_aerosol.jobs import job_queue
 from msu_aerosol.models import (
     Complex,
     ComplexView,
@@ -32,6 +35,8 @@ from msu_aerosol.models import (
     DeviceView,
     Graph,
     GraphView,
+    Job,
+    JobView,
     ProtectedView,
     Role,
     TimeColumn,
@@ -39,6 +44,10 @@ from msu_aerosol.models import (
     UserFieldView,
     VariableColumn,
 )
+from msu_aerosol.render_cache import render_cache
+from msu_aerosol.sources import transfer
+from msu_aerosol.storage import partition_cache
+from msu_aerosol.sync_state import sync_state
 
 __all__ = []
 
@@ -123,20 +132,7 @@ class AdminSettingsView(AdminIndexView):
             or request.form.getlist(f'{graph.name}_cb_def') != default_cols
             or request.form.get(f'datetime_format_{graph.name}')
             != graph.time_format
-            or not Path(
-                f'templates/'
-                f'includes/'
-                f'graphs/'
-                f'full/'
-                f'graph_{graph.name}.html',
-            ).exists()
-            or not Path(
-                f'templates/'
-                f'includes/'
-                f'graphs/'
-                f'recent/'
-                f'graph_{graph.name}.html',
-            ).exists()
+            or not all(find_fragment(graph.name, view) for view in page_views)
         )
 
     def recreate_device(self, full_name_reloaded: str) -> str:
@@ -173,11 +169,7 @@ class AdminSettingsView(AdminIndexView):
         )
         db.session.add(new_device)
         db.session.commit()
-        if os.name == 'nt':
-            asyncio.set_event_loop_policy(
-                asyncio.WindowsSelectorEventLoopPolicy(),
-            )
-        asyncio.run(
+        transfer.run(
             download_device_data(
                 new_device.full_name,
                 new_device.link,
@@ -188,6 +180,29 @@ class AdminSettingsView(AdminIndexView):
             success='Данные успешно обновлены',
         )
 
+    @classmethod
+    def reprocess_devices(
+        cls,
+        device_to_graphs: dict[Device, list[Graph]],
+    ) -> list[Job]:
+        """
+        Постановка в очередь пред обработки всех данных приборов
+        и перерисовки их графиков, по задаче на прибор.
+
+        :param device_to_graphs: Словарь вида {Прибор: [*Графики]}
+        :return: Поставленные задачи
+        """
+
+        return [
+            job_queue.enqueue(
+                'reprocess',
+                device_id=device.id,
+                user_id=current_user.id,
+                graph_ids=[graph.id for graph in graphs],
+            )
+            for device, graphs in device_to_graphs.items()
+        ]
+
     def is_accessible(self) -> bool:
         return (
             current_user.is_authenticated
@@ -221,6 +236,17 @@ class AdminSettingsView(AdminIndexView):
                     ):
                         changed.append(graph)
 
+                # Все графики проверяются до сохранения настроек,
+                # поэтому при ошибке ни одна задача не ставится в очередь
+                for graph in changed:
+                    if not set(
+                        request.form.getlist(f'{graph.name}_cb_def'),
+                    ).issubset(set(request.form.getlist(f'{graph.name}_cb'))):
+                        return self.get_admin_template(
+                            error='Не совпадают списки столбцов.',
+                        )
+
+                device_to_graphs: dict[Device, list[Graph]] = {}
                 for graph in changed:
                     checkboxes = request.form.getlist(f'{graph.name}_cb')
                     radio = request.form.get(f'{graph.name}_rb')
@@ -230,69 +256,49 @@ class AdminSettingsView(AdminIndexView):
                     )
                     colors = request.form.getlist(f'color_{graph.name}')
                     coefficients = request.form.getlist(f'coeff_{graph.name}')
-                    if set(defaults).issubset(set(checkboxes)):
-                        for col, color, cf in zip(
-                            VariableColumn.query.filter_by(
-                                graph_id=graph.id,
-                            ),
-                            colors,
-                            coefficients,
-                        ):
-                            col.use = col.name in checkboxes
-                            col.default = col.name in defaults
-                            col.color = color
-                            col.coefficient = cf
-
-                        for time_col in TimeColumn.query.filter_by(
+                    for col, color, cf in zip(
+                        VariableColumn.query.filter_by(
                             graph_id=graph.id,
-                        ):
-                            time_col.use = time_col.name == radio
-                        graph.time_format = time_format
-                        db.session.commit()
-                        try:
-                            full_name = (
-                                Device.query.filter_by(id=graph.device_id)
-                                .first()
-                                .full_name
-                            )
-                            preprocess_device_data(
-                                full_name,
-                                graph,
-                            )
-                            make_graph(graph, 'full')
-                            make_graph(graph, 'recent')
-
-                        except TimeFormatError:
-                            return self.get_admin_template(
-                                error='Формат времени не подходит под столбец',
-                            )
-
-                        except ColumnsMatchError:
-                            return self.get_admin_template(
-                                error='Обнаружено несовпадение столбцов',
-                            )
-
-                        except ValueError:
-                            return self.get_admin_template(
-                                error='Невозможно предобработать данные '
-                                'по выбранным столбцам',
-                            )
-
-                        except Exception as e:
-                            error = e.__class__.__name__
-                            return self.get_admin_template(
-                                error=f'Непредвиденная ошибка: {error}',
-                            )
-                    else:
-                        return self.get_admin_template(
-                            error='Не совпадают списки столбцов.',
-                        )
+                        ),
+                        colors,
+                        coefficients,
+                    ):
+                        col.use = col.name in checkboxes
+                        col.default = col.name in defaults
+                        col.color = color
+                        col.coefficient = cf
+
+                    for time_col in TimeColumn.query.filter_by(
+                        graph_id=graph.id,
+                    ):
+                        time_col.use = time_col.name == radio
+                    graph.time_format = time_format
+                    db.session.commit()
+                    device_to_graphs.setdefault(graph.device, []).append(
+                        graph,
+                    )
+
+                # Данные каждого прибора обрабатываются один раз,
+                # после чего перерисовываются его измененные графики.
+                # Это долго, поэтому выполняется в фоновой задаче,
+                # которая сама отмечает графики созданными
+                jobs = self.reprocess_devices(device_to_graphs)
 
                 for graph in all_graphs:
+                    if graph in changed:
+                        continue
                     device = Device.query.filter_by(id=graph.device_id).first()
                     device.show = True
                     graph.created = True
                     db.session.commit()
+                if jobs:
+                    return self.get_admin_template(
+                        success=(
+                            'Пред обработка поставлена в очередь (задачи '
+                            f'{", ".join(f"№{job.id}" for job in jobs)}), '
+                            'ход выполнения - на странице «Задачи»'
+                        ),
+                    )
 
         return self.get_admin_template()
 
@@ -315,6 +321,24 @@ class AdminLogsView(BaseView):
         )
 
 
+class AdminStatsView(BaseView):
+    def is_accessible(self) -> bool:
+        return (
+            current_user.is_authenticated
+            and current_user.role.can_access_admin
+        )
+
+    @expose('/')
+    def admin_stats(self):
+        return self.render(
+            'admin/admin_stats.html',
+            caches={
+                'Файлы-месяцы': partition_cache.stats(),
+                'Отрисовка графиков': render_cache.stats(),
+            },
+        )
+
+
 def get_complexes_dict() -> dict[Complex, list[Device]]:
     """
     Функция, возвращающая словарь,
@@ -421,9 +445,7 @@ def device_after_insert(mapper, connection, target) -> None:
     :return: None
     """
 
-    if os.name == 'nt':
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(download_device_data(target.full_name, target.link))
+    transfer.run(download_device_data(target.full_name, target.link))
 
     @listens_for(db.session, 'after_flush', once=True)
     def receive_after_flush(session, context) -> None:
@@ -453,15 +475,10 @@ def remove_device_data(full_name: str) -> None:
     :return: None
     """
 
-    graph_full = f'templates/includes/graphs/full/graph_{full_name}.html'
-    graph_rec = f'templates/includes/graphs/recent/graph_{full_name}.html'
     proc_data = f'proc_data/{full_name}'
     data = f'data/{full_name}'
-    if Path(graph_full).exists():
-        Path(graph_full).unlink()
-
-    if Path(graph_rec).exists():
-        Path(graph_rec).unlink()
+    for view in views:
+        remove_fragment(full_name, view)
 
     if Path(proc_data).exists():
         shutil.rmtree(proc_data)
@@ -469,6 +486,8 @@ def remove_device_data(full_name: str) -> None:
     if Path(data).exists():
         shutil.rmtree(data)
 
+    sync_state.remove(full_name)
+
 
 @listens_for(Device, 'after_delete')
 def after_delete(mapper, connection, target) -> None:
@@ -498,10 +517,41 @@ admin_settings: Admin = Admin(
 )
 
 login_manager: LoginManager = LoginManager()
-scheduler: BackgroundScheduler = BackgroundScheduler()
+# Каждый прибор обновляется своей задачей. Задача прибора
+# не запускается повторно, пока не закончился предыдущий запуск,
+# а пропущенные запуски объединяются в один
+scheduler: BackgroundScheduler = BackgroundScheduler(
+    executors={'default': ThreadPoolExecutor(download_concurrency)},
+    job_defaults={'coalesce': True, 'max_instances': 1},
+)
 atexit.register(lambda: scheduler.shutdown())
 
 
+def poll_device(full_name: str, link: str, archived: bool) -> None:
+    """
+    Задача обновления одного прибора.
+    После обновления интервал до следующего запуска подстраивается
+    под то, как часто прибор обновляет данные.
+
+    :param full_name: Полное название прибора
+    :param link: Ссылка на данные прибора
+    :param archived: В архиве ли прибор
+    :return: None
+    """
+
+    changed = refresh_device(full_name, link, app=application)
+    try:
+        scheduler.reschedule_job(
+            f'downloader_{full_name}',
+            trigger='interval',
+            seconds=sync_state.next_interval(full_name, changed, archived),
+            jitter=poll_jitter,
+        )
+    except JobLookupError:
+        # Прибор удалили, пока он обновлялся
+        ...
+
+
 @listens_for(Device, 'after_insert')
 @listens_for(Device, 'after_delete')
 def init_schedule(mapper, connection, target, app=None) -> None:
@@ -510,6 +560,7 @@ def init_schedule(mapper, connection, target, app=None) -> None:
     добавлении записи в таблицу graphs.
     Перезапускает scheduler для избежания ошибок,
     связанных с обновлением несуществующих приборов.
+    Для каждого прибора заводится своя задача обновления.
 
     :param mapper: Необходимый аргумент для декоратора listens_for,
                    не используется в функции
@@ -525,19 +576,18 @@ def init_schedule(mapper, connection, target, app=None) -> None:
     global application
     if app:
         application = app
-    name_to_link = {
-        i.full_name: i.link for i in Device.query.all() if i.show or i.archived
-    }
+    devices = [i for i in Device.query.all() if i.show or i.archived]
     if scheduler.running or not (mapper and connection and target):
         scheduler.remove_all_jobs()
-        scheduler.add_job(
-            func=download_last_modified_file,
-            trigger='interval',
-            seconds=120 * len(name_to_link.keys()),
-            id='downloader',
-            args=[name_to_link],
-            kwargs={'app': application},
-        )
+        for device in devices:
+            scheduler.add_job(
+                func=poll_device,
+                trigger='interval',
+                seconds=sync_state.get_interval(device.full_name),
+                jitter=poll_jitter,
+                id=f'downloader_{device.full_name}',
+                args=[device.full_name, device.link, device.archived],
+            )
 
     if not scheduler.running:
         scheduler.start()
@@ -559,6 +609,19 @@ def init_admin(app: Flask) -> None:
             endpoint='/logs',
         ),
     )
+    admin_settings.add_view(
+        AdminStatsView(
+            name='Статистика',
+            endpoint='/stats',
+        ),
+    )
+    admin_settings.add_view(
+        JobView(
+            Job,
+            db.session,
+            name='Задачи',
+        ),
+    )
     admin_settings.add_view(
         ComplexView(
             Complex,
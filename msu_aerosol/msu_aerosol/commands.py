@@ -1,8 +1,11 @@
 import click
 from flask import Blueprint
+from flask.cli import with_appcontext
 from werkzeug.security import generate_password_hash
 
-from msu_aerosol.models import db, Role, User
+from msu_aerosol.models import db, Device, Role, User
+from msu_aerosol.rollups import rebuild_rollups
+from msu_aerosol.storage import migrate_device
 
 __all__ = []
 
@@ -49,3 +52,32 @@ def create_superuser(login: str, email: str, password: str) -> None:
     db.session.commit()
 
     click.echo('Superuser created successfully.')
+
+
+@click.command('migrate-storage')
+@with_appcontext
+def migrate_storage() -> None:
+    """
+    Команда перевода обработанных данных приборов из CSV в Parquet.
+
+    :return: None
+    """
+
+    for device in Device.query.all():
+        migrated = migrate_device(device.name)
+        click.echo(f'{device.name}: {migrated} файлов переведено в Parquet')
+
+
+@click.command('build-rollups')
+@with_appcontext
+def build_rollups() -> None:
+    """
+    Команда пересчета агрегатов (1min, 10min, 1h, 1d) всех приборов
+    по обработанным данным.
+
+    :return: None
+    """
+
+    for device in Device.query.all():
+        rebuild_rollups(device.name)
+        click.echo(f'{device.name}: агрегаты пересчитаны')
@@ -12,6 +12,52 @@ basedir = Path(os.path.dirname(__file__)).resolve().parent
 yadisk_token = os.getenv('YADISK_TOKEN', default='FAKE_TOKEN')
 upload_folder = 'received_data'
 allowed_extensions = ['csv', 'xlsx']
+# Сколько приборов одновременно опрашивается при обновлении данных
+download_concurrency = int(os.getenv('DOWNLOAD_CONCURRENCY', default=8))
+# Повторы скачивания файла при ошибках соединения
+# и начальная задержка между ними в секундах (удваивается с каждой попыткой)
+download_retries = int(os.getenv('DOWNLOAD_RETRIES', default=3))
+download_backoff = float(os.getenv('DOWNLOAD_BACKOFF', default=1))
+# Источник исходных файлов приборов: yandex - Я.Диск,
+# local - локальная папка (для тестов и нагрузочных замеров без сети)
+data_source = os.getenv('DATA_SOURCE', default='yandex')
+local_source_root = os.getenv('LOCAL_SOURCE_ROOT', default='local_source')
+# Задержка каждого запроса к локальному источнику в секундах
+# и доля запросов, которые завершаются ошибкой
+local_source_latency = float(os.getenv('LOCAL_SOURCE_LATENCY', default=0))
+local_source_failure_rate = float(
+    os.getenv('LOCAL_SOURCE_FAILURE_RATE', default=0),
+)
+# Границы интервала опроса прибора в секундах, во сколько раз он растет,
+# пока данные прибора не меняются, и случайный разброс времени запуска
+poll_min_interval = int(os.getenv('POLL_MIN_INTERVAL', default=60))
+poll_max_interval = int(os.getenv('POLL_MAX_INTERVAL', default=3600))
+poll_backoff = float(os.getenv('POLL_BACKOFF', default=1.5))
+poll_jitter = int(os.getenv('POLL_JITTER', default=30))
+# Файл, в котором хранятся последние обработанные файлы приборов
+sync_state_file = 'schema/sync_state.json'
+# Сколько мегабайт памяти занимает кэш считанных файлов-месяцев
+# (0 - кэш отключен)
+partition_cache_mb = int(os.getenv('PARTITION_CACHE_MB', default=256))
+# Сколько точек каждой линии отправляется в браузер
+# и как данные до них прореживаются: lttb, minmax или mean
+graph_max_points = int(os.getenv('GRAPH_MAX_POINTS', default=2000))
+downsampling_method = os.getenv('DOWNSAMPLING_METHOD', default='lttb')
+# Как записываются данные в отрисованные графики: typed - типизированными
+# массивами в base64 с общим для линий временем, json - списками чисел
+graph_encoding = os.getenv('GRAPH_ENCODING', default='typed')
+# Сколько потоков выполняют фоновые задачи (загрузки и пред обработку)
+# и как часто в секундах они проверяют очередь
+job_workers = int(os.getenv('JOB_WORKERS', default=2))
+job_poll_interval = float(os.getenv('JOB_POLL_INTERVAL', default=1))
+# Загружаются ли графики главной страницы по мере прокрутки
+# (1 - да, 0 - все графики встраиваются в страницу)
+# и сколько первых графиков загружается сразу после открытия страницы
+lazy_graphs = os.getenv('LAZY_GRAPHS', default='1') == '1'
+homepage_prefetch = int(os.getenv('HOMEPAGE_PREFETCH', default=4))
+# Показываются ли на главной странице миниатюры графиков
+# (интерактивный график загружается по щелчку на миниатюре)
+homepage_sparklines = os.getenv('HOMEPAGE_SPARKLINES', default='1') == '1'
 
 
 class Config:
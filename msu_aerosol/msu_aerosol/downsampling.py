@@ -0,0 +1,218 @@
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+__all__ = []
+
+
+def bucket_edges(size: int, buckets: int) -> np.ndarray:
+    """
+    Функция, делящая индексы 0..size на buckets почти равных частей
+    :param size: число точек
+    :param buckets: число частей
+    :return: границы частей длиной buckets + 1
+    """
+    return np.linspace(0, size, buckets + 1).astype(np.int64)
+
+
+def lttb(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Прореживание методом Largest-Triangle-Three-Buckets:
+    первая и последняя точки сохраняются, а из каждой корзины между ними
+    берется точка, образующая наибольший треугольник с выбранной точкой
+    предыдущей корзины и средней точкой следующей.
+    Форма линии, в том числе пики, при этом сохраняется
+    :param x: время в секундах, по возрастанию
+    :param y: значения без пропусков
+    :param max_points: сколько точек оставить
+    """
+    size = len(x)
+    if size <= max_points:
+        return x, y
+    if max_points < 3:
+        # Корзин между первой и последней точками нет
+        selected = np.array([0, size - 1][: max(max_points, 1)])
+        return x[selected], y[selected]
+    edges = bucket_edges(size - 2, max_points - 2) + 1
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else size
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous]),
+        )
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+    return x[selected], y[selected]
+
+
+def min_max(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Прореживание, оставляющее минимум и максимум каждой корзины
+    (в порядке времени), поэтому размах данных не теряется
+    :param x: время в секундах, по возрастанию
+    :param y: значения без пропусков
+    :param max_points: сколько точек оставить
+    """
+    size = len(x)
+    if size <= max_points:
+        return x, y
+    if max_points < 2:
+        # Для одной точки остается только максимум
+        selected = np.array([int(y.argmax())])
+        return x[selected], y[selected]
+    edges = bucket_edges(size, max_points // 2)
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        low = start + int(y[start:end].argmin())
+        high = start + int(y[start:end].argmax())
+        selected.extend(sorted({low, high}))
+    selected = np.array(selected, dtype=np.int64)
+    return x[selected], y[selected]
+
+
+def bucket_mean(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Прореживание, заменяющее каждую корзину ее средней точкой.
+    Сглаживает шум, но меняет сами значения
+    :param x: время в секундах, по возрастанию
+    :param y: значения без пропусков
+    :param max_points: сколько точек оставить
+    """
+    size = len(x)
+    if size <= max_points:
+        return x, y
+    starts = bucket_edges(size, max(max_points, 1))[:-1]
+    counts = np.diff(np.append(starts, size))
+    return (
+        # Время округляется до миллисекунд
+        np.round(np.add.reduceat(x, starts) / counts, 3),
+        (np.add.reduceat(y.astype(np.float64), starts) / counts).astype(
+            y.dtype,
+        ),
+    )
+
+
+methods: dict[str, Callable] = {
+    'lttb': lttb,
+    'minmax': min_max,
+    'mean': bucket_mean,
+}
+
+
+def downsample_series(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int,
+    method: str = 'lttb',
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Функция, прореживающая один ряд не более чем до max_points точек.
+    Точки с данными прореживаются вместе, а на месте пропусков (NaN),
+    которые длиннее корзины прореживания и поэтому видны на графике,
+    остается по одной точке NaN, чтобы линия разрывалась.
+    Отдельные пропущенные значения при прореживании не видны
+    и точек не занимают
+    :param x: время в секундах, по возрастанию
+    :param y: значения с пропусками
+    :param max_points: сколько точек оставить
+    :param method: lttb, minmax или mean
+    :return: время и значения оставшихся точек
+    """
+    max_points = max(max_points, 1)
+    valid = ~np.isnan(y)
+    if valid.all():
+        return methods[method](x, y, max_points)
+    # Первая точка каждого пропуска, перед которой есть данные,
+    # и первая точка с данными после него (len(y), если их нет)
+    gaps = np.flatnonzero(~valid[1:] & valid[:-1]) + 1
+    resumes = np.flatnonzero(valid[1:] & ~valid[:-1]) + 1
+    after = np.append(resumes, len(y))[np.searchsorted(resumes, gaps)]
+    span = x[np.minimum(after, len(y) - 1)] - x[gaps - 1]
+    width = (x[-1] - x[0]) / max_points
+    gaps, span = gaps[span > width], span[span > width]
+    # Пропуски не занимают больше половины точек: остаются самые длинные
+    if len(gaps) > max_points // 2:
+        longest = np.argsort(-span, kind='stable')[: max_points // 2]
+        gaps = np.sort(gaps[longest])
+    new_x, new_y = methods[method](
+        x[valid],
+        y[valid],
+        max_points - len(gaps),
+    )
+    new_x = np.concatenate([new_x, x[gaps]])
+    new_y = np.concatenate([new_y, y[gaps]])
+    order = np.argsort(new_x, kind='stable')
+    return new_x[order], new_y[order]
+
+
+def downsample_frame(
+    df: pd.DataFrame,
+    time_col: str,
+    columns: list[str],
+    max_points: int,
+    method: str = 'lttb',
+) -> pd.DataFrame:
+    """
+    Функция, прореживающая столбцы датафрейма по отдельности
+    :param df: датафрейм, отсортированный по времени
+    :param time_col: временной столбец
+    :param columns: какие столбцы прорежить
+    :param max_points: сколько точек оставить в каждом столбце
+    :param method: lttb, minmax или mean
+    :return: датафрейм в длинном формате со столбцами
+    time_col, variable (имя столбца) и value (значение)
+    """
+    if method not in methods:
+        raise ValueError(f'Неизвестный метод прореживания: {method}')
+    time = df[time_col].to_numpy(dtype='datetime64[ns]')
+    origin = time[0] if len(time) else np.datetime64(0, 'ns')
+    # Время в секундах от первой точки: так его точности float64 хватает
+    x = (time - origin).astype(np.int64) / 1e9
+    frames = []
+    for col in columns:
+        y = df[col].to_numpy()
+        if y.dtype.kind != 'f':
+            y = y.astype(np.float64)
+        new_x, new_y = downsample_series(x, y, max_points, method)
+        if not len(new_x):
+            continue
+        frames.append(
+            pd.DataFrame(
+                {
+                    time_col: origin
+                    + np.round(new_x * 1e9).astype('timedelta64[ns]'),
+                    'variable': col,
+                    'value': new_y,
+                },
+            ),
+        )
+    if not frames:
+        return pd.DataFrame(
+            {
+                time_col: pd.Series(dtype='datetime64[ns]'),
+                'variable': pd.Series(dtype=object),
+                'value': pd.Series(dtype=np.float32),
+            },
+        )
+    return pd.concat(frames, ignore_index=True)
@@ -19,3 +19,13 @@ class CouldNotPreprocessDataError(Exception):
 class FileExtensionError(Exception):
     def __init__(self, message):
         super().__init__(message)
+
+
+class SourceError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class SeriesRequestError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,149 @@
+import base64
+from uuid import uuid4
+
+import numpy as np
+import plotly.io.json as plotly_json
+import plotly.offline as offline
+
+__all__ = []
+
+# Как записываются данные графиков: json - списками чисел и строк времени,
+# как их пишет plotly; typed - типизированными массивами plotly.js
+# ({dtype, bdata} в base64), время - по массиву на каждое различное время
+# линий (общее только у линий с одинаковыми точками: без прореживания
+# или при прореживании средними по корзинам)
+figure_encodings = ('json', 'typed')
+
+# Разметка графика в режиме typed повторяет разметку plotly.
+# Каждый различный массив времени раскодируется один раз,
+# а линии ссылаются на него по номеру. Время записывается
+# началом и шагами в миллисекундах (u4) или, если шаг не помещается
+# в u4, миллисекундами от 1970 года (f8)
+typed_figure_html = """\
+<div><div id="{id}" class="plotly-graph-div" \
+style="height:100%; width:100%;"></div>\
+<script type="text/javascript">\
+window.PLOTLYENV=window.PLOTLYENV || {{}};\
+(function () {{\
+var time = {time}.map(function (axis) {{\
+var bytes = Uint8Array.from(atob(axis.bdata), function (c) {{\
+return c.charCodeAt(0);\
+}});\
+if (axis.dtype === 'f8') {{ return new Float64Array(bytes.buffer); }}\
+var steps = new Uint32Array(bytes.buffer);\
+var x = new Float64Array(steps.length);\
+for (var i = 0, t = axis.start; i < steps.length; i++) {{\
+t += steps[i];\
+x[i] = t;\
+}}\
+return x;\
+}});\
+var data = {data};\
+data.forEach(function (trace) {{ trace.x = time[trace.x]; }});\
+if (document.getElementById("{id}")) {{\
+Plotly.newPlot("{id}", data, {layout}, {config});\
+}}\
+}})();\
+</script></div>"""
+
+
+def encode_array(values: np.ndarray, encoding: str) -> list | dict:
+    """
+    Функция, кодирующая массив для ответа
+    :param values: массив чисел
+    :param encoding: json или typed
+    :return: список (пропуски - null) или типизированный массив plotly.js
+    """
+    if encoding == 'typed':
+        return {
+            'dtype': values.dtype.str.lstrip('<'),
+            'bdata': base64.b64encode(values.tobytes()).decode('ascii'),
+        }
+    if values.dtype == np.float32:
+        # Числа float32 записываются их кратчайшей записью (1.2),
+        # а не цифрами того же числа в float64 (1.2000000476837158)
+        values = values.astype(str).astype(np.float64)
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def encode_time(values: np.ndarray, encoding: str) -> list | dict:
+    """
+    Функция, кодирующая моменты времени для ответа
+    :param values: массив datetime64[ns]
+    :param encoding: json или typed
+    :return: строки ISO 8601 или миллисекунды от 1970 года (float64),
+    которые plotly.js понимает на оси дат
+    """
+    if encoding == 'typed':
+        milliseconds = values.astype('datetime64[ns]').astype(np.int64) / 1e6
+        return encode_array(milliseconds, encoding)
+    return np.datetime_as_string(values, unit='s').tolist()
+
+
+def encode_time_steps(values: np.ndarray) -> dict:
+    """
+    Функция, кодирующая моменты времени графика началом и шагами.
+    Шаги между соседними точками небольшие и часто повторяются,
+    поэтому занимают вдвое меньше места и хорошо сжимаются
+    :param values: массив datetime64[ns] по возрастанию
+    :return: {start, dtype: u4, bdata} или {dtype: f8, bdata},
+    если шаг не помещается в u4
+    """
+    milliseconds = np.round(
+        values.astype('datetime64[ns]').astype(np.int64) / 1e6,
+    ).astype(np.int64)
+    if not len(milliseconds):
+        return {'start': 0, **encode_array(np.array([], 'u4'), 'typed')}
+    steps = np.diff(milliseconds, prepend=milliseconds[0])
+    if steps.min() < 0 or steps.max() > np.iinfo(np.uint32).max:
+        return encode_array(milliseconds.astype(np.float64), 'typed')
+    return {
+        'start': int(milliseconds[0]),
+        **encode_array(steps.astype(np.uint32), 'typed'),
+    }
+
+
+def figure_html(data: list[dict], layout: dict, encoding: str) -> str:
+    """
+    Функция, записывающая график в HTML для вставки в страницу
+    (без самой библиотеки plotly.js)
+    :param data: линии графика, x - массив datetime64, y - массив чисел
+    :param layout: макет графика
+    :param encoding: json или typed
+    :return: HTML графика
+    """
+    if encoding not in figure_encodings:
+        raise ValueError(f'Неизвестная кодировка графика: {encoding}')
+    if encoding == 'json':
+        # Макет уже проверен plotly при создании,
+        # поэтому повторная проверка отключена
+        return offline.plot(
+            {'data': data, 'layout': layout},
+            output_type='div',
+            include_plotlyjs=False,
+            validate=False,
+        )
+    time = {}
+    traces = []
+    for trace in data:
+        x = np.asarray(trace['x'], dtype='datetime64[ns]')
+        y = np.asarray(trace['y'])
+        if y.dtype.kind != 'f':
+            y = y.astype(np.float64)
+        # Линии с одинаковыми моментами времени получают один массив
+        axis = encode_time_steps(x)
+        key = (axis.get('start'), axis['bdata'])
+        if key not in time:
+            time[key] = (len(time), axis)
+        traces.append(
+            dict(trace, x=time[key][0], y=encode_array(y, encoding)),
+        )
+    # Время передается числами, поэтому тип оси задается явно
+    layout = dict(layout, xaxis=dict(layout.get('xaxis', {}), type='date'))
+    return typed_figure_html.format(
+        id=uuid4(),
+        time=plotly_json.to_json_plotly([axis for _, axis in time.values()]),
+        data=plotly_json.to_json_plotly(traces),
+        layout=plotly_json.to_json_plotly(layout),
+        config=plotly_json.to_json_plotly({'responsive': True}),
+    )
@@ -0,0 +1,181 @@
+import gzip
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Iterable
+
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+__all__ = []
+
+# Папка с отрисованными графиками: <вид>/graph_<график>.<расширение>.
+# Графики - это данные, поэтому они лежат отдельно от шаблонов
+# и не компилируются Jinja при каждом обновлении
+graphs_path = 'graphs'
+# Прежнее место графиков, откуда они переносятся при первом обращении
+legacy_graphs_path = 'templates/includes/graphs'
+# Виды, которые вставляются в страницы: без них график нужно построить
+# заново. Миниатюра дописывается при следующей отрисовке короткого вида
+page_views = ('full', 'recent')
+views = (*page_views, 'sparkline')
+# Виды, которые хранятся не в HTML: миниатюры для главной страницы
+suffixes = {'sparkline': 'svg'}
+# Сжатые копии графиков, которые сервер отдает как есть, без сжатия
+# на лету: кодировка -> (расширение, функция сжатия), по предпочтению.
+# brotli необязателен: без него пишутся только копии gzip
+compressors: dict[str, tuple[str, Callable[[bytes], bytes]]] = {}
+if brotli is not None:
+    compressors['br'] = ('br', brotli.compress)
+compressors['gzip'] = ('gz', gzip.compress)
+
+
+def fragment_path(graph_name: str, view: str) -> Path:
+    """
+    Функция, возвращающая путь к отрисованному графику
+    :param graph_name: имя графика
+    :param view: вид графика (full, recent или sparkline)
+    """
+    suffix = suffixes.get(view, 'html')
+    return Path(graphs_path, view, f'graph_{graph_name}.{suffix}')
+
+
+def find_fragment(graph_name: str, view: str) -> Path | None:
+    """
+    Функция, находящая отрисованный график.
+    График, отрисованный до появления отдельной папки,
+    переносится в нее
+    :param graph_name: имя графика
+    :param view: вид графика (full, recent или sparkline)
+    :return: путь к графику или None, если его еще нет
+    """
+    path = fragment_path(graph_name, view)
+    if path.exists():
+        return path
+    legacy = Path(legacy_graphs_path, view, path.name)
+    if not legacy.exists():
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    legacy.replace(path)
+    return path
+
+
+def compressed_path(path: Path, encoding: str) -> Path:
+    """
+    Функция, возвращающая путь к сжатой копии графика
+    :param path: путь к графику
+    :param encoding: кодировка (ключ в compressors)
+    """
+    return path.with_name(f'{path.name}.{compressors[encoding][0]}')
+
+
+def replace_file(path: Path, content: bytes) -> None:
+    """
+    Функция, заменяющая файл целиком, поэтому читатели
+    не увидят наполовину записанный файл
+    :param path: путь к файлу
+    :param content: новое содержимое
+    """
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    tmp_path.write_bytes(content)
+    tmp_path.replace(path)
+
+
+def write_fragment(
+    graph_name: str,
+    view: str,
+    content: str,
+    compress: bool = True,
+) -> Path:
+    """
+    Функция, записывающая отрисованный график и его сжатые копии.
+    Копии пишутся после графика, поэтому копия, которая старше графика,
+    устарела и не отдается
+    :param graph_name: имя графика
+    :param view: вид графика (full, recent или sparkline)
+    :param content: HTML или SVG графика
+    :param compress: записывать ли сжатые копии
+    :return: путь к графику
+    """
+    path = fragment_path(graph_name, view)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = content.encode('utf-8')
+    replace_file(path, data)
+    if compress:
+        for encoding, (_, compress_func) in compressors.items():
+            replace_file(compressed_path(path, encoding), compress_func(data))
+    return path
+
+
+def find_compressed(
+    path: Path,
+    accepted: Iterable[str],
+) -> tuple[Path, str | None]:
+    """
+    Функция, выбирающая сжатую копию графика для ответа
+    :param path: путь к графику
+    :param accepted: кодировки, которые принимает браузер
+    :return: путь к копии и ее кодировка или путь к графику и None,
+    если подходящей свежей копии нет
+    """
+    accepted = set(accepted)
+    modified = path.stat().st_mtime_ns
+    for encoding in compressors:
+        if encoding not in accepted:
+            continue
+        compressed = compressed_path(path, encoding)
+        if compressed.exists() and compressed.stat().st_mtime_ns >= modified:
+            return compressed, encoding
+    return path, None
+
+
+def remove_fragment(graph_name: str, view: str) -> None:
+    """
+    Функция, удаляющая отрисованный график вместе со сжатыми копиями
+    :param graph_name: имя графика
+    :param view: вид графика (full, recent или sparkline)
+    """
+    path = fragment_path(graph_name, view)
+    path.unlink(missing_ok=True)
+    for encoding in compressors:
+        compressed_path(path, encoding).unlink(missing_ok=True)
+
+
+class FragmentCache:
+    """
+    Кэш отрисованных графиков для вставки в страницы.
+    Файл перечитывается, только если изменились его время или размер.
+    """
+
+    def __init__(self) -> None:
+        self.entries: dict[Path, tuple[tuple[int, int], Markup]] = {}
+        self.lock = Lock()
+
+    def get(self, graph_name: str, view: str) -> Markup:
+        """
+        Содержимое графика.
+
+        :param graph_name: Имя графика
+        :param view: Вид графика (full, recent или sparkline)
+        :return: HTML или SVG графика или пустая строка, если его еще нет
+        """
+
+        path = find_fragment(graph_name, view)
+        if path is None:
+            return Markup('')
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        content = Markup(path.read_text(encoding='utf-8'))
+        with self.lock:
+            self.entries[path] = (version, content)
+        return content
+
+
+fragment_cache = FragmentCache()
@@ -1,27 +1,68 @@
 import asyncio
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from io import BytesIO
 import json
+import logging
 import os
 from pathlib import Path
+from typing import Callable, Iterable
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import plotly.offline as offline
-from yadisk import AsyncYaDisk, YaDisk
-from yadisk.exceptions import InternalServerError, YaDiskConnectionError
 
-from msu_aerosol.config import yadisk_token
-from msu_aerosol.exceptions import ColumnsMatchError, TimeFormatError
+from msu_aerosol.config import (
+    download_backoff,
+    download_retries,
+    downsampling_method,
+    graph_encoding,
+    graph_max_points,
+)
+from msu_aerosol.downsampling import downsample_frame
+from msu_aerosol.exceptions import (
+    ColumnsMatchError,
+    SourceError,
+    TimeFormatError,
+)
+from msu_aerosol.figures import figure_html
+from msu_aerosol.fragments import write_fragment
 from msu_aerosol.models import Device, Graph, TimeColumn, VariableColumn
+from msu_aerosol.render_cache import render_cache, render_key
+from msu_aerosol.rollups import (
+    aggregate_raw,
+    aggregate_tier,
+    base_columns,
+    choose_tier,
+    tier_covers,
+    tiers,
+    update_rollups,
+)
+from msu_aerosol.sources import source, transfer
+from msu_aerosol.sparklines import sparkline_points, sparkline_svg
+from msu_aerosol.storage import (
+    export_csv,
+    load_meta,
+    mark_ingested,
+    partition_path,
+    read_range,
+    to_numeric,
+    upsert_partition,
+)
+from msu_aerosol.sync_state import file_md5, sync_state
 
 pd.set_option('future.no_silent_downcasting', True)
 
 __all__ = []
 
+logger = logging.getLogger(__name__)
+
 main_path = 'data'
-disk_async = AsyncYaDisk(token=yadisk_token)
-disk_sync = YaDisk(token=yadisk_token)
+# Сколько уже обработанных строк перечитывается при дочитывании файла,
+# чтобы найти пробел на стыке старых и новых данных
+tail_context_lines = 100
+# Сколько последних дней измерений показывает каждый вид графика
+view_days = {'full': 14, 'recent': 2}
 
 
 def get_device_by_name(name: str, app=None) -> Device | None:
@@ -65,131 +106,288 @@ def load_colors() -> list:
         return json.load(colors)
 
 
-def no_csv(link: str) -> bool | None:
+def newest_data_file(items: Iterable[dict]) -> dict | None:
     """
-    Функция, которая определяет, есть ли csv в полученных файлах прибора
-    :param link: ссылка, на данные прибора в Я.Диске
+    Функция, находящая за один проход последний измененный файл с данными.
+    Если в папке есть csv, то берется последний csv, иначе - последний txt.
+    :param items: файлы в папке прибора
     """
+    newest: dict = {'.csv': None, '.txt': None}
+    for item in items:
+        for extension, current in newest.items():
+            if item['name'].endswith(extension) and (
+                current is None or item['modified'] > current['modified']
+            ):
+                newest[extension] = item
+    return newest['.csv'] or newest['.txt']
 
+
+def get_last_modified_item(link: str) -> dict | None:
+    """
+    Функция, возвращающая объект последнего измененного файла прибора.
+    :param link: ссылка на данные прибора в Я.Диске
+    """
     try:
-        return all(
-            not i['name'].endswith('.csv')
-            for i in disk_sync.get_public_meta(link, limit=1000)['embedded'][
-                'items'
-            ]
-        )
+        return newest_data_file(source.iter_items(link))
+    except SourceError:
+        return None
+
+
+def download_tail(file_path: str, item: dict) -> bool:
+    """
+    Функция, докачивающая в локальную копию файла только новые байты.
+    Получится, только если источник это умеет,
+    а локальная копия - начало файла в источнике (проверяется по md5).
+    :param file_path: путь к локальной копии файла
+    :param item: объект файла в источнике
+    :return: совпадает ли теперь локальная копия с файлом в источнике
+    """
+    path = Path(file_path)
+    if not path.exists() or path.stat().st_size > item['size']:
+        return False
+    try:
+        if path.stat().st_size < item['size'] and not source.download_tail(
+            item,
+            file_path,
+        ):
+            return False
+    except SourceError:
+        return False
+    return not item['md5'] or file_md5(path) == item['md5']
 
-    except InternalServerError:
+
+def fetch_last_modified_file(
+    full_name: str,
+    link: str,
+) -> tuple[str, dict] | None:
+    """
+    Функция, скачивающая последний измененный файл прибора.
+    Если этот файл уже был обработан в текущем виде, он не скачивается,
+    а если он только дописался - скачиваются только новые байты.
+    :param full_name: имя прибора
+    :param link: ссылка на данные прибора в источнике
+    :return: путь к скачанному файлу и его объект в источнике
+    или None, если скачивать нечего
+    """
+    last_modified_file = get_last_modified_item(link)
+    if last_modified_file is None:
+        return None
+    # Путь для сохранения исходного файла.
+    file_path = f'{main_path}/{full_name}/{last_modified_file["name"]}'
+    if sync_state.is_unchanged(full_name, last_modified_file, file_path):
+        return None
+    if download_tail(file_path, last_modified_file):
+        return file_path, last_modified_file
+    try:
+        source.download(last_modified_file, file_path)
+    except SourceError:
         return None
+    return file_path, last_modified_file
 
 
-def download_last_modified_file(name_to_link: dict[str:str], app=None) -> None:
+def process_device_file(
+    full_name: str,
+    file_path: str,
+    app=None,
+    offset: int = 0,
+) -> int | None:
     """
-    :param name_to_link: словарь, где ключ - имя прибора,
-    значение - ссылка на его данные в Я.Диске
+    Функция, обрабатывающая обновленный файл прибора
+    и пересоздающая его графики
+    :param full_name: имя прибора
+    :param file_path: путь к обновленному файлу
     :param app: объект приложения Flask
-    Функция, обновляющая последний измененный файл по каждому прибору
-    """
-    list_data_path = []
-    # Выбор последнего измененного файла по каждому прибору
-    for full_name, link in name_to_link.items():
-        # Объект последнего измененного файла по прибору
-        csv_not_exists = no_csv(link)
-        if csv_not_exists is not None:
-            last_modified_file = sorted(
-                filter(
-                    lambda y: y['name'].endswith(
-                        '.txt' if csv_not_exists else '.csv',
-                    ),
-                    disk_sync.get_public_meta(link, limit=1000)['embedded'][
-                        'items'
-                    ],
-                ),
-                key=lambda x: x['modified'],
-            )[-1]
+    :param offset: с какого байта файл еще не обработан
+    :return: до какого байта файл обработан или None, если не удалось
+    """
+    dev = get_device_by_name(full_name, app)
+    if dev.archived:  # Если в архиве
+        return 0
+    try:
+        # Пред обработка обновленного файла (только его новой части)
+        # один раз для всех графиков прибора
+        new_offset = preprocess_device_file(
+            dev,
+            file_path,
+            app=app,
+            offset=offset,
+            live=True,
+        )
+        # Графики берутся из БД заново: объект прибора уже вне сеанса
+        with app.app_context() if app else nullcontext():
+            graphs = Graph.query.filter_by(device_id=dev.id).all()
+        # Пересоздание полного и короткого графиков за одно чтение данных
+        for j in graphs:
+            render_graphs(j, app=app)
+    except (
+        ColumnsMatchError,
+        TimeFormatError,
+        KeyError,
+        ValueError,
+        OSError,
+    ):
+        logger.exception('Не удалось обработать файл %s', file_path)
+        return None
+    return new_offset
 
-        else:
-            return
-        # Путь для сохранения исходного файла.
-        file_path = f'{main_path}/{full_name}/{last_modified_file["name"]}'
-        try:
-            disk_sync.download_by_link(
-                last_modified_file['file'],
-                file_path,
-            )
-        except YaDiskConnectionError:
-            return
-        list_data_path.append([full_name, file_path])
-    # Для каждого обновленного файла
-    for i in list_data_path:
-        dev = get_device_by_name(i[0], app)
-        if not dev.archived:  # Если не в архиве
-            try:
-                if app:
-                    with app.app_context():
-                        graphs = Graph.query.filter_by(device_id=dev.id)
-                else:
-                    graphs = Graph.query.filter_by(device_id=dev.id)
-                for j in graphs:
-                    # Пред обработка обновленного файла
-                    preprocessing_one_file(j, i[1], app=app)
-                    # Пересоздание полного графика
-                    make_graph(j, spec_act='full', app=app)
-                    # Пересоздание короткого графика
-                    make_graph(j, spec_act='recent', app=app)
-
-            except (KeyError, Exception):
-                ...
+
+def ingest_device_file(
+    full_name: str,
+    file_path: str,
+    item: dict,
+    app=None,
+) -> None:
+    """
+    Функция, обрабатывающая скачанный файл прибора
+    и запоминающая, до какого места он обработан
+    :param full_name: имя прибора
+    :param file_path: путь к скачанному файлу
+    :param item: объект файла в источнике
+    :param app: объект приложения Flask
+    """
+    offset = process_device_file(
+        full_name,
+        file_path,
+        app=app,
+        offset=sync_state.get_offset(full_name, item, file_path),
+    )
+    if offset is not None:
+        sync_state.update(full_name, item, file_path, offset)
+
+
+def refresh_device(full_name: str, link: str, app=None) -> bool:
+    """
+    Функция, обновляющая данные одного прибора
+    :param full_name: имя прибора
+    :param link: ссылка на данные прибора в источнике
+    :param app: объект приложения Flask
+    :return: изменился ли последний файл прибора
+    """
+    fetched = fetch_last_modified_file(full_name, link)
+    if fetched is None:
+        return False
+    ingest_device_file(full_name, *fetched, app=app)
+    return True
 
 
 async def download_file(full_name: str, element: dict) -> None:
     """
-    Функция для скачивания файла из Я.Диска
+    Функция для скачивания файла из источника.
+    Файл пишется на диск по частям, по мере получения.
+    При ошибке источника скачивание повторяется
+    с экспоненциально растущей задержкой,
+    а недокачанная часть файла удаляется при любой ошибке.
     :param full_name: имя прибора
     :param element: Объект файла, который необходимо скачать
     """
-    loop = asyncio.get_event_loop()
-    async with disk_async:
-        await loop.run_in_executor(
-            None,
-            disk_sync.download_by_link,
-            element['file'],
-            f'{main_path}/{full_name}/{element["name"]}',
-        )
+    file_path = Path(f'{main_path}/{full_name}/{element["name"]}')
+    part_path = file_path.with_name(f'{file_path.name}.part')
+    async with transfer.semaphore:
+        try:
+            for attempt in range(download_retries + 1):
+                try:
+                    await source.adownload(element, str(part_path))
+                    part_path.replace(file_path)
+                    return
+                except SourceError:
+                    if attempt == download_retries:
+                        raise
+                    await asyncio.sleep(download_backoff * 2**attempt)
+        finally:
+            # Недокачанный файл не остается на диске ни при какой ошибке
+            part_path.unlink(missing_ok=True)
 
 
 async def download_device_data(full_name: str, link: str) -> None:
     """
-    Функция для загрузки всех данных прибора на сервер с Я.Диска
+    Функция для загрузки всех данных прибора на сервер с Я.Диска.
+    Выполняется через transfer.run.
+    csv скачиваются сразу по мере перебора списка файлов,
+    txt - только если в папке так и не нашлось ни одного csv
     :param full_name: имя прибора
     :param link: ссылка на его Я.Диск
     """
+    Path(f'{main_path}/{full_name}').mkdir(parents=True, exist_ok=True)
     tasks: list = []
-    items = disk_sync.get_public_meta(link, limit=1000)
-    for i in items['embedded']['items']:
-        if not Path(f'{main_path}/{full_name}').exists():
-            Path(f'{main_path}/{full_name}').mkdir(parents=True)
-        if i['name'].endswith('.csv') or (
-            i['name'].endswith('.txt') and no_csv(link)
-        ):
-            tasks.append(download_file(full_name, i))
-
+    txt_items: list | None = []
+    async for i in source.aiter_items(link):
+        if i['name'].endswith('.csv'):
+            txt_items = None
+            tasks.append(asyncio.create_task(download_file(full_name, i)))
+        elif i['name'].endswith('.txt') and txt_items is not None:
+            txt_items.append(i)
+
+    tasks.extend(download_file(full_name, i) for i in txt_items or [])
     await asyncio.gather(*tasks)
 
 
-def preprocess_device_data(name_folder: str, graph: Graph, app=None) -> None:
+def get_reference_graph(device: Device) -> Graph | None:
+    """
+    Функция, возвращающая график прибора,
+    по временному столбцу которого обрабатываются файлы прибора
+    :param device: объект записи в БД из таблицы devices
+    """
+    return next(
+        (
+            graph
+            for graph in device.graphs
+            if any(col.use for col in graph.time_columns)
+        ),
+        None,
+    )
+
+
+def preprocess_device_file(
+    device: Device,
+    path: str,
+    user_upload=False,
+    app=None,
+    offset: int = 0,
+    live: bool = False,
+) -> int | None:
+    """
+    Функция для пред обработки файла прибора, одна на все его графики:
+    в файлы-месяцы сразу записываются столбцы всех графиков прибора
+    :param device: объект записи в БД из таблицы devices
+    :param path: путь, по которому расположен исходный файл с данными.
+    :param user_upload:
+    Флаг, отображающий, загружает ли пользователь свои данные
+    :param app: объект приложения Flask
+    :param offset: с какого байта файл еще не обработан
+    :param live: дописывается ли файл прибором
+    :return: до какого байта файл обработан
+    """
+    graph = get_reference_graph(device)
+    if graph is None:
+        return None
+    return preprocessing_one_file(
+        graph,
+        path,
+        user_upload=user_upload,
+        app=app,
+        offset=offset,
+        live=live,
+    )
+
+
+def preprocess_device_data(
+    device: Device,
+    app=None,
+    progress: Callable[[int, int], None] | None = None,
+) -> None:
     """
     Функция для пред обработки всех файлов прибора
-    :param name_folder: имя папки, где лежат не пред обработанные файлы прибора
-    :param graph: объект записи в БД из таблицы graphs
+    :param device: объект записи в БД из таблицы devices
     :param app: объект приложения Flask
+    :param progress: функция, вызываемая после каждого файла
+    с числом обработанных файлов и их общим числом
     """
-    for name_file in os.listdir(f'{main_path}/{name_folder}'):
-        preprocessing_one_file(
-            graph,
-            f'{main_path}/{name_folder}/{name_file}',
-            app=app,
-        )
+    folder = f'{main_path}/{device.full_name}'
+    names = os.listdir(folder)
+    for i, name_file in enumerate(names, start=1):
+        preprocess_device_file(device, f'{folder}/{name_file}', app=app)
+        if progress:
+            progress(i, len(names))
 
 
 def get_time_col(graph: Graph) -> str:
@@ -210,34 +408,79 @@ def get_time_col(graph: Graph) -> str:
 def proc_spaces(df: pd.DataFrame, time_col: str) -> pd.DataFrame:
     """
     Функция, удаляющая пробелы между большими временными промежутками.
+    Пробелом считается промежуток между соседними по времени строками,
+    который больше самого частого промежутка в 1.3 раза. На границах
+    каждого пробела добавляются пустые строки, чтобы график прерывался.
+    Типы столбцов сохраняются.
     :param df: Датафрейм, в котором удаляются промежутки
     :param time_col: временной столбец
     """
-    df = df.sort_values(by=time_col)
+    # Повторяющиеся столбцы (общие у нескольких графиков) оставляем один раз
+    df = df.loc[:, ~df.columns.duplicated()].sort_values(
+        by=time_col,
+        ignore_index=True,
+    )
+    if len(df) < 2:
+        return df
+    diffs = df[time_col].diff()
     # diff_mode - временной промежуток между соседними по времени строками,
     # после которого считается, что пробел большой
-    diff_mode = df[time_col].diff().mode().values[0] * 1.3
-    new_rows = []
-    for i in range(len(df) - 1):
-        diff = df.loc[i + 1, time_col] - df.loc[i, time_col]
-        if diff > diff_mode:
-            new_date1 = df.loc[i, time_col] + pd.Timedelta(seconds=1)
-            new_date2 = df.loc[i + 1, time_col] - pd.Timedelta(seconds=1)
-            new_row1 = {time_col: new_date1}
-            new_row2 = {time_col: new_date2}
-            new_rows.extend([new_row1, new_row2])
+    diff_mode = diffs.mode().iloc[0] * 1.3
+    gaps = (diffs > diff_mode).to_numpy()
+    after_gap = df[time_col].to_numpy()[gaps]
+    before_gap = df[time_col].shift(1).to_numpy()[gaps]
+    new_dates = np.empty(2 * len(after_gap), dtype=after_gap.dtype)
+    new_dates[0::2] = before_gap + np.timedelta64(1, 's')
+    new_dates[1::2] = after_gap - np.timedelta64(1, 's')
     return pd.concat(
-        [df.T.drop_duplicates().T, pd.DataFrame(new_rows)],
+        [df, pd.DataFrame({time_col: new_dates})],
         ignore_index=True,
     )
 
 
+def read_tail(path: str, offset: int, end: int) -> bytes:
+    """
+    Функция, считывающая заголовок файла и его часть от offset до end.
+    Вместе с ней перечитываются несколько предшествующих строк.
+    :param path: путь к исходному файлу
+    :param offset: с какого байта файл еще не обработан
+    :param end: до какого байта файл обрабатывается
+    """
+    with Path(path).open('rb') as f:
+        header = f.readline()
+        start = max(offset - (1 << 16), len(header))
+        f.seek(start)
+        block = f.read(max(offset - start, 0))
+        if start > len(header):
+            # Первая строка блока может быть неполной
+            first_line_end = block.find(b'\n') + 1
+            block = block[first_line_end:]
+        context = b''.join(
+            block.splitlines(keepends=True)[-tail_context_lines:],
+        )
+        return header + context + f.read(max(end - f.tell(), 0))
+
+
+def complete_lines_end(path: str) -> int:
+    """
+    Функция, возвращающая смещение конца последней полной строки файла
+    :param path: путь к исходному файлу
+    """
+    with Path(path).open('rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - (1 << 16), 0))
+        block = f.read()
+    return size - len(block) + block.rfind(b'\n') + 1
+
+
 def preprocessing_one_file(
     graph: Graph,
     path: str,
     user_upload=False,
     app=None,
-) -> None:
+    offset: int = 0,
+    live: bool = False,
+) -> int | None:
     """
     Функция для пред обработки файла прибора
     :param graph: объект записи в БД из таблицы graphs
@@ -245,16 +488,32 @@ def preprocessing_one_file(
     :param user_upload:
     Флаг, отображающий, загружает ли пользователь свои данные
     :param app: Объект приложения Flask
+    :param offset: с какого байта файл еще не обработан,
+    0 - обработать файл целиком
+    :param live: дописывается ли файл прибором
+    (последний измененный файл прибора в источнике)
+    :return: до какого байта файл обработан
     """
     if app:
         with app.app_context():
             device = Device.query.filter_by(id=graph.device_id).first()
     else:
         device = Device.query.filter_by(id=graph.device_id).first()
-    # Считывание датафрейма из файла
+    # В дописываемом файле последняя строка может быть еще неполной:
+    # она обработается при следующем обновлении.
+    # Остальные файлы уже дописаны и обрабатываются до конца
+    end_offset = (
+        complete_lines_end(path) if live else Path(path).stat().st_size
+    )
+    # Считывание датафрейма из файла (или только из его новой части)
+    raw_file = (
+        BytesIO(read_tail(path, offset, end_offset))
+        if offset or end_offset < Path(path).stat().st_size
+        else path
+    )
     if path.endswith('.csv'):
         df = pd.read_csv(
-            path,
+            raw_file,
             sep=None,
             engine='python',
             decimal=',',
@@ -262,7 +521,7 @@ def preprocessing_one_file(
         )
     else:
         df = pd.read_csv(
-            path,
+            raw_file,
             sep='\t',
             encoding='latin',
             decimal=',',
@@ -270,28 +529,30 @@ def preprocessing_one_file(
         )
     # Если файл пустой, то останавливаем пред обработку
     if df.shape[0] == 0:
-        return
+        return end_offset
     # Получение временного столбца
     if app:
         with app.app_context():
             time_col = get_time_col(graph)
     else:
         time_col = get_time_col(graph)
-    # Получение всех столбцов прибора
-    columns = [j.name for j in graph.columns if j.use]
-    if any(
-        (i not in list(df.columns) for i in [time_col] + columns),
-    ):
-        raise ColumnsMatchError('Проблемы с совпадением столбцов')
+    # Получение всех столбцов прибора (всех его графиков)
     res = [time_col]
     for i in [
         [col.name for col in g.columns if col.use == 1] for g in device.graphs
     ]:
         res += i
+    if any(
+        (i not in list(df.columns) for i in res),
+    ):
+        raise ColumnsMatchError('Проблемы с совпадением столбцов')
+    # Столбец может использоваться в нескольких графиках прибора
+    res = list(dict.fromkeys(res))
     df = df[res]
     df = df.map(lambda x: x.strip() if isinstance(x, str) else x)
-    if not Path(f'proc_data/{device.name}').exists():
-        Path(f'proc_data/{device.name}').mkdir(parents=True)
+    # Десятичные запятые и типы данных приводятся один раз, при обработке,
+    # поэтому в файлах-месяцах лежат уже готовые для отрисовки числа
+    df = to_numeric(df, [col for col in res[1:] if col != time_col])
     # НЕ тривиально: я создаю столбец timestamp,
     # тк дальше это основной временной столбец
     try:
@@ -307,59 +568,25 @@ def preprocessing_one_file(
     except (TypeError, ValueError):
         if not app:
             raise TimeFormatError('Проблемы с форматом времени')
-        return
+        return None
     time_col = 'timestamp'
     # Удаление пробелов
     df = proc_spaces(df, time_col)
     df[time_col] = pd.to_datetime(df[time_col])
-    # Перераспределение данных по файлам-месяцам (один файл - один месяц)
-    for year in df[time_col].dt.year.unique():
-        for month in df[time_col].dt.month.unique():
-            df_month = df.loc[
-                (
-                    (df[time_col].dt.month == month)
-                    & (df[time_col].dt.year == year)
-                )
-            ]
-            month = '0' + str(month) if month < 10 else str(month)
-            file_path = f'proc_data/{device.name}/{year}_{month}.csv'
-            # Если файл уже существовал ранее
-            if Path(file_path).exists() or user_upload:
-                df_help = pd.read_csv(file_path)
-                df_month.loc[:, time_col] = pd.to_datetime(
-                    df_month.loc[:, time_col],
-                )
-                df_help[time_col] = pd.to_datetime(df_help[time_col])
-                # Два датафрейма объединяются
-                result = pd.merge(df_month, df_help, on=time_col, how='outer')
-                for column in df_month.columns:
-                    if column in df_help.columns and column != time_col:
-                        result[column] = result[column + '_x'].fillna(
-                            result[column + '_y'],
-                        )
-                        result.drop(
-                            columns=[column + '_x', column + '_y'],
-                            inplace=True,
-                        )
-                result.drop_duplicates()
-                df_month = result
-            if len(df_month) == 0:
-                continue
-            df_month = df_month.sort_values(by=time_col).drop_duplicates(
-                subset=[time_col],
-            )
-
-            res = [time_col]
-            for i in [
-                [col.name for col in g.columns if col.use == 1]
-                for g in device.graphs
-            ]:
-                res += i
-            for column in res:
-                if column not in df_month.columns:
-                    df_month[column] = pd.NA
-            df_month = df_month[res]
-            df_month.to_csv(file_path, index=False)
+    # Перераспределение данных по файлам-месяцам (один файл - один месяц).
+    # Строки группируются по месяцу за один проход
+    columns = list(dict.fromkeys([time_col] + res[1:]))
+    period = df[time_col].dt.year * 100 + df[time_col].dt.month
+    for key, df_month in df.groupby(period, sort=True):
+        upsert_partition(
+            partition_path(device.name, key // 100, key % 100),
+            df_month,
+            columns,
+        )
+    # Пересчет агрегатов только для корзин, в которые попали новые строки
+    update_rollups(device.name, df[time_col].min(), df[time_col].max())
+    mark_ingested(device.name)
+    return end_offset
 
 
 def choose_range(graph: Graph, app=None) -> tuple[pd.Timestamp, pd.Timestamp]:
@@ -368,16 +595,16 @@ def choose_range(graph: Graph, app=None) -> tuple[pd.Timestamp, pd.Timestamp]:
     :param graph: объект записи в БД из таблицы graphs
     :param app: объект приложения Flask
     """
-    list_files = os.listdir(f'proc_data/{graph.device.name}')
     if app:
         with app.app_context():
             name = Device.query.filter_by(id=graph.device_id).first().name
     else:
         name = Device.query.filter_by(id=graph.device_id).first().name
-    proc_data = f'proc_data/{name}/{max(list_files)}'
-    max_date = pd.to_datetime(
-        pd.read_csv(proc_data)['timestamp'].iloc[-1],
-    )
+    # Последнее время берется из сводки по прибору, без чтения данных
+    last = load_meta(name)['last']
+    if last is None:
+        raise FileNotFoundError(f'Нет обработанных данных прибора {name}')
+    max_date = pd.Timestamp(last)
     min_date = max_date - timedelta(days=14)
     return min_date, max_date
 
@@ -391,196 +618,131 @@ def get_spaced_colors(n):
     return (combined_palette * (n // len(combined_palette) + 1))[:n:]
 
 
-def make_graph(
-    graph: Graph,
-    spec_act: str,
-    begin_record_date=None,
-    end_record_date=None,
-    app=None,
-) -> None | BytesIO:
+def tier_width(tier: str | None) -> pd.Timedelta:
     """
-    Функция для создания и отрисовки графика
-    :param graph: объект записи в БД из таблицы graphs
-    :param spec_act: full, recent, download - метка,
-    которая отделяет действия только для определенных типов.
-    :param begin_record_date: Начальная дата отрисовки графика
-    :param end_record_date: конечная дата отрисовки графика
-    :param app: объект приложения Flask
+    Функция, возвращающая ширину корзины уровня агрегатов
+    :param tier: уровень агрегатов или None для исходных данных
+    """
+    return tiers[tier] if tier is not None else pd.Timedelta(0)
+
+
+def read_views(
+    device_name: str,
+    starts: dict[str, pd.Timestamp],
+    end: pd.Timestamp,
+    max_points: int,
+) -> dict[str, pd.DataFrame]:
+    """
+    Функция, считывающая за одно чтение данные для нескольких видов графика.
+    Каждому виду нужен самый крупный уровень агрегатов, которого хватает
+    на max_points точек. Считывается самый мелкий из этих уровней
+    за самый длинный промежуток, а более крупные собираются из него
+    в памяти так же, как при записи агрегатов
+    :param device_name: имя прибора
+    :param starts: начало промежутка каждого вида
+    :param end: общий конец промежутков
+    :param max_points: сколько точек нужно на промежутке
+    :return: средние значения столбцов каждого вида
+    с пропусками на месте разрывов
     """
-    # Если spec_act == 'download', то данные о загрузке поступают с сайта.
-    # А begin_record_date и end_record_date из календаря,
-    # поэтому необходимо обрабатывать формат времени
-    if spec_act == 'download':
-        begin_record_date = pd.to_datetime(
-            begin_record_date,
-            format=(
-                '%Y-%m-%dT%H:%M'
-                if pd.to_datetime(begin_record_date).second == 0
-                else '%Y-%m-%dT%H:%M:%S'
-            ),
-        )
-        end_record_date = pd.to_datetime(
-            end_record_date,
-            format=(
-                '%Y-%m-%dT%H:%M'
-                if pd.to_datetime(end_record_date).second == 0
-                else '%Y-%m-%dT%H:%M:%S'
-            ),
-        )
-    # Общий временной столбец
     time_col = 'timestamp'
-    # Если любая из границ не существует
-    if not begin_record_date or not end_record_date:
-        begin_record_date, end_record_date = choose_range(graph, app=app)
-    # Задаем промежуток прорисовки согласно spec_act
-    if spec_act == 'full':
-        begin_record_date = end_record_date - timedelta(days=15)
-    if spec_act == 'recent':
-        begin_record_date = end_record_date - timedelta(days=3)
-    current_date, com_data = begin_record_date, pd.DataFrame()
-    # Считываем и объединяем файлы,
-    # которые могут содержать данные нужные для отрисовки
-    while current_date <= end_record_date + timedelta(days=100):
-        try:
-            data = pd.read_csv(
-                f'proc_data/'
-                f'{graph.device.name}/'
-                f'{current_date.strftime("%Y_%m")}.csv',
+    view_tiers = {
+        view: choose_tier(start, end, max_points)
+        for view, start in starts.items()
+    }
+    finest = min(view_tiers.values(), key=tier_width)
+    first = min(starts.values())
+    if finest is not None and not tier_covers(device_name, finest, first):
+        # Агрегаты есть не за весь промежуток (данные обработаны
+        # до их появления), поэтому все уровни собираются
+        # из исходных данных
+        finest = None
+    df = read_range(device_name, start=first, end=end, tier=finest)
+    frames = {}
+    for view, start in starts.items():
+        tier = view_tiers[view]
+        if tier == finest:
+            frame = df[df[time_col] >= start]
+        else:
+            # Берутся только корзины, целиком попадающие в промежуток
+            part = df[df[time_col] >= start.ceil(tiers[tier])]
+            part = part.dropna(subset=[time_col])
+            frame = (
+                aggregate_raw(part, tiers[tier])
+                if finest is None
+                else aggregate_tier(part, tiers[tier])
+            )
+        if tier is not None:
+            # На графике рисуются средние, а на месте пропусков
+            # в данных линия разрывается, как и для исходных данных
+            frame = proc_spaces(
+                frame[[time_col] + base_columns(frame)],
+                time_col,
             )
-            com_data = pd.concat([com_data, data], ignore_index=True)
-            current_date += timedelta(days=25)
+        frames[view] = frame
+    return frames
 
-        except FileNotFoundError:
-            current_date += timedelta(days=25)
 
-    com_data = com_data.drop_duplicates()
-    com_data[time_col] = pd.to_datetime(com_data[time_col])
-    m = max(com_data[time_col])
-    last_48_hours = [m - timedelta(days=2), m]
-    last_2_weeks = [m - timedelta(days=14), m]
-
-    # Обрезаем com_data согласно временным рамкам в зависимости от spec_act
-    if spec_act == 'recent':
-        com_data = com_data.loc[
-            (last_48_hours[0] <= pd.to_datetime(com_data[time_col]))
-            & (pd.to_datetime(com_data[time_col]) <= last_48_hours[1])
-        ]
-    if spec_act == 'full':
-        com_data = com_data.loc[
-            (last_2_weeks[0] <= pd.to_datetime(com_data[time_col]))
-            & (pd.to_datetime(com_data[time_col]) <= last_2_weeks[1])
-        ]
-    com_data.set_index(time_col, inplace=True)
-    com_data = com_data.replace(
-        ',',
-        '.',
-        regex=True,
-    ).astype(float)
-    # Доступные столбцы для отрисовки
-    cols_to_draw = [i.name for i in graph.columns if i.use]
-    # Если spec_act == 'download', то данные сохраняются в формате csv
-    if spec_act == 'download':
-        buffer = BytesIO()
-        com_data.reset_index(inplace=True)
-        com_data = com_data.loc[
-            (begin_record_date <= pd.to_datetime(com_data[time_col]))
-            & (pd.to_datetime(com_data[time_col]) <= end_record_date)
-        ]
-        com_data.to_csv(buffer, index=False)
-        buffer.seek(0)
-        return buffer
-
-    if spec_act == 'recent' and len(com_data) * len(cols_to_draw) > 500:
-        # Для увеличения скорости загрузки и просты интерпретации
-        # удаляются выбросы, промежуточные точки и сглаживаются данные
-        q1, q3 = com_data.quantile(0.1), com_data.quantile(0.9)
-        iqr = com_data.quantile(0.9) - com_data.quantile(0.1)
-        lower_bound, upper_bound = q1 - 1.5 * iqr, q3 + 1.5 * iqr
-        filtered_df = com_data[
-            ((com_data >= lower_bound) & (com_data <= upper_bound)).all(axis=1)
-        ]
-        std = filtered_df.std()
-        mask = (com_data.diff().abs().div(std) <= 1).all(axis=1)
-        consecutive_true = mask & mask.shift(1, fill_value=False)
-        mask[(consecutive_true.cumsum() % 2 == 0) & consecutive_true] = False
-        com_data.loc[mask, :] = (
-            com_data.loc[mask, :].values
-            + com_data.loc[mask.shift(-1, fill_value=False), :].values
-        ) / 2
-        mask_shifted = mask.shift(-1, fill_value=False)
-        com_data = com_data[~mask_shifted]
-    com_data.reset_index(inplace=True)
-    com_data = com_data.drop_duplicates(subset=[time_col])
-    com_data = com_data.sort_values(by=time_col)
-    # Для упрощения анализа столбцы умножаются на заранее заданные коэффициенты
-    if app:
-        with app.app_context():
-            for i in VariableColumn.query.filter_by(
-                graph_id=graph.id,
-                use=True,
-            ):
-                com_data[i.name] = com_data[i.name] * i.coefficient
-    else:
-        for i in VariableColumn.query.filter_by(graph_id=graph.id, use=True):
-            com_data[i.name] = com_data[i.name] * i.coefficient
-    # Сортируем столбцы таким образом, чтобы более маленькие рисовались позже
-    cols_to_draw = (
-        com_data[cols_to_draw]
-        .mean()
-        .sort_values(ascending=False)
-        .index.tolist()
-    )
-    index_dict = {value: index for index, value in enumerate(cols_to_draw)}
+def read_plot_range(
+    device_name: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    max_points: int,
+) -> pd.DataFrame:
+    """
+    Функция, считывающая данные прибора для отрисовки.
+    Берется самый крупный уровень агрегатов, которого хватает
+    на max_points точек, а если его нет - исходные данные
+    :param device_name: имя прибора
+    :param start: начало промежутка
+    :param end: конец промежутка
+    :param max_points: сколько точек нужно на промежутке
+    :return: средние значения столбцов с пропусками на месте разрывов
+    """
+    return read_views(device_name, {'': start}, end, max_points)['']
 
-    # Используем рендеринг без WebGL, если spec_act != 'recent'
-    use_webgl = not spec_act == 'recent'
 
+def figure_template(
+    graph: Graph,
+    full_name: str,
+    columns: list[VariableColumn],
+) -> dict:
+    """
+    Функция, создающая общий для всех видов графика макет и оформление линий.
+    plotly express вызывается один раз на пустых данных,
+    а виды графика получают из него линии со своими точками
+    :param graph: объект записи в БД из таблицы graphs
+    :param full_name: полное имя прибора (заголовок графика)
+    :param columns: отрисовываемые столбцы графика
+    :return: словарь графика plotly, линии в нем по именам столбцов
+    """
+    time_col = 'timestamp'
+    names = [i.name for i in columns]
     fig = px.line(
-        com_data,
+        pd.DataFrame(
+            {
+                time_col: pd.to_datetime([0] * len(names)),
+                'variable': names,
+                'value': np.nan,
+            },
+        ),
         x=time_col,
-        y=cols_to_draw,
-        render_mode='webgl' if use_webgl else 'svg',
-        color_discrete_sequence=[
-            i.color
-            for i in sorted(
-                [j for j in graph.columns if j.use],
-                key=lambda x: index_dict[x.name],
-            )
-        ],  # цвета столбцов
+        y='value',
+        color='variable',
+        category_orders={'variable': names},
+        render_mode='webgl',
+        color_discrete_map={i.name: i.color for i in columns},  # цвета
     )
     # Если в настройках указано, что столбца изначально не видно, то legendonly
-    for trace in fig.data:
-        for i in graph.columns:
-            if i.name == trace['name']:
-                trace.name = (
-                    f'{i.name}'
-                    if i.coefficient == 1
-                    else f'{i.name} * {i.coefficient}'
-                )
-                trace.visible = True if i.default else 'legendonly'
-                break
-
-    if app:
-        with app.app_context():
-            full_name = (
-                Device.query.filter_by(
-                    id=graph.device_id,
-                )
-                .first()
-                .full_name
-            )
-    else:
-        full_name = (
-            Device.query.filter_by(
-                id=graph.device_id,
-            )
-            .first()
-            .full_name
+    for trace, i in zip(fig.data, columns):
+        trace.name = (
+            f'{i.name}'
+            if i.coefficient == 1
+            else f'{i.name} * {i.coefficient}'
         )
-    # Доступные столбцы для отрисовки
-    columns = [i.name for i in graph.columns if i.use]
+        trace.visible = True if i.default else 'legendonly'
     # По запросу работодателей мы сделали заливку для BCbb и BCff
-    if 'BCbb' in columns or 'BCff' in columns:
+    if 'BCbb' in names or 'BCff' in names:
         fig.update_traces(fill='tozeroy', line={'width': 2})
 
     # Настройка макета
@@ -594,10 +756,6 @@ def make_graph(
 
     # Настройка осей
     fig.update_xaxes(
-        range=[
-            datetime.now() - timedelta(2 if spec_act == 'recent' else 14),
-            datetime.now(),
-        ],
         zerolinecolor='grey',
         zerolinewidth=1,
         gridcolor='grey',
@@ -617,19 +775,199 @@ def make_graph(
         linecolor='black',
         mirror=True,
     )
+    template = fig.to_dict()
+    template['data'] = dict(zip(names, template['data']))
+    return template
 
-    # Сохранение графика в файл
-    offline.plot(
-        fig,
-        filename=(
-            f'templates/'
-            f'includes/'
-            f'graphs/'
-            f'{spec_act}'
-            f'/graph_{graph.name}.html'
-        ),
-        auto_open=False,
-        include_plotlyjs=False,
+
+def render_graphs(
+    graph: Graph,
+    spec_acts: Iterable[str] = ('full', 'recent'),
+    app=None,
+) -> None:
+    """
+    Функция, отрисовывающая несколько видов графика за одно чтение данных.
+    Диапазон, настройки столбцов и прибор берутся из БД один раз,
+    данные считываются один раз, а макет графика создается один раз.
+    Виды, входные данные и настройки которых не изменились
+    с последней отрисовки, не перерисовываются
+    :param graph: объект записи в БД из таблицы graphs
+    :param spec_acts: full, recent - какие виды отрисовать
+    (вместе с recent сохраняется миниатюра sparkline)
+    :param app: объект приложения Flask
+    """
+    time_col = 'timestamp'
+    with app.app_context() if app else nullcontext():
+        # График мог быть загружен в другом, уже закрытом сеансе БД,
+        # поэтому он и его прибор берутся заново
+        graph = Graph.query.get(graph.id)
+        device_name = graph.device.name
+        _, end_record_date = choose_range(graph)
+        full_name = graph.device.full_name
+        columns = [i for i in graph.columns if i.use]
+        # Все, кроме данных и промежутка, от чего зависит отрисовка
+        # (use учитывается составом списка столбцов)
+        settings = [
+            full_name,
+            [[i.name, i.default, i.color, i.coefficient] for i in columns],
+            [i.name for i in graph.time_columns if i.use],
+            graph_max_points,
+            downsampling_method,
+            graph_encoding,
+        ]
+        starts = {
+            spec_act: end_record_date - timedelta(days=view_days[spec_act])
+            for spec_act in spec_acts
+        }
+        keys = {
+            spec_act: render_key(
+                device_name,
+                settings,
+                start,
+                end_record_date,
+            )
+            for spec_act, start in starts.items()
+        }
+        starts = {
+            spec_act: start
+            for spec_act, start in starts.items()
+            if not render_cache.fresh(graph.name, spec_act, keys[spec_act])
+        }
+        if not starts:
+            return
+        template = figure_template(graph, full_name, columns)
+    frames = read_views(
+        device_name,
+        starts,
+        end_record_date,
+        graph_max_points,
     )
+    now = datetime.now()
+    for spec_act, com_data in frames.items():
+        com_data = com_data.drop_duplicates(subset=[time_col])
+        com_data = com_data.sort_values(by=time_col)
+        # Для упрощения анализа столбцы умножаются
+        # на заранее заданные коэффициенты
+        com_data = com_data.assign(
+            **{i.name: com_data[i.name] * i.coefficient for i in columns},
+        )
+        # Сортируем столбцы таким образом,
+        # чтобы более маленькие рисовались позже
+        cols_to_draw = (
+            com_data[[i.name for i in columns]]
+            .mean()
+            .sort_values(ascending=False)
+            .index.tolist()
+        )
+        # Каждая линия прореживается до graph_max_points точек,
+        # поэтому размер графика не зависит от частоты измерений
+        plot_data = downsample_frame(
+            com_data,
+            time_col,
+            cols_to_draw,
+            graph_max_points,
+            downsampling_method,
+        )
+        # Используем рендеринг без WebGL, если spec_act == 'recent'
+        trace_type = 'scatter' if spec_act == 'recent' else 'scattergl'
+        data = []
+        for col, points in plot_data.groupby('variable', sort=False):
+            trace = dict(
+                template['data'][col],
+                x=points[time_col].to_numpy(),
+                y=points['value'].to_numpy(),
+                type=trace_type,
+            )
+            if trace_type == 'scatter':
+                trace['orientation'] = 'v'
+            data.append(trace)
+        layout = dict(template['layout'])
+        layout['xaxis'] = dict(
+            layout['xaxis'],
+            range=[now - timedelta(days=view_days[spec_act]), now],
+        )
+        # Сохранение графика в хранилище графиков
+        write_fragment(
+            graph.name,
+            spec_act,
+            figure_html(data, layout, graph_encoding),
+        )
+        if spec_act == 'recent':
+            # Миниатюра для главной страницы строится по тем же данным,
+            # но без plotly и по видимым по умолчанию столбцам
+            write_fragment(
+                graph.name,
+                'sparkline',
+                sparkline_svg(
+                    downsample_frame(
+                        com_data,
+                        time_col,
+                        [i.name for i in columns if i.default],
+                        sparkline_points,
+                        downsampling_method,
+                    ),
+                    time_col,
+                    columns,
+                    starts[spec_act],
+                    end_record_date,
+                ),
+                # Миниатюры встраиваются в страницу и отдельно не отдаются
+                compress=False,
+            )
+        render_cache.put(graph.name, spec_act, keys[spec_act])
 
-    return None
+
+def make_graph(
+    graph: Graph,
+    spec_act: str,
+    begin_record_date=None,
+    end_record_date=None,
+    app=None,
+    resolution: str | None = None,
+) -> None | BytesIO:
+    """
+    Функция для создания и отрисовки графика
+    :param graph: объект записи в БД из таблицы graphs
+    :param spec_act: full, recent, download - метка,
+    которая отделяет действия только для определенных типов.
+    :param begin_record_date: Начальная дата отрисовки графика
+    :param end_record_date: конечная дата отрисовки графика
+    :param app: объект приложения Flask
+    :param resolution: уровень агрегатов для скачивания
+    (по умолчанию исходные данные)
+    """
+    if spec_act != 'download':
+        render_graphs(graph, [spec_act], app=app)
+        return None
+    # Данные о загрузке поступают с сайта, а begin_record_date
+    # и end_record_date из календаря, поэтому необходимо
+    # обрабатывать формат времени
+    begin_record_date = pd.to_datetime(
+        begin_record_date,
+        format=(
+            '%Y-%m-%dT%H:%M'
+            if pd.to_datetime(begin_record_date).second == 0
+            else '%Y-%m-%dT%H:%M:%S'
+        ),
+    )
+    end_record_date = pd.to_datetime(
+        end_record_date,
+        format=(
+            '%Y-%m-%dT%H:%M'
+            if pd.to_datetime(end_record_date).second == 0
+            else '%Y-%m-%dT%H:%M:%S'
+        ),
+    )
+    # Считываем по индексу только файлы-месяцы, пересекающиеся с промежутком
+    com_data = read_range(
+        graph.device.name,
+        start=begin_record_date,
+        end=end_record_date,
+        tier=resolution if resolution in tiers else None,
+    )
+    com_data = com_data.drop_duplicates()
+    # Данные сохраняются в формате csv
+    buffer = BytesIO()
+    export_csv(com_data, buffer)
+    buffer.seek(0)
+    return buffer
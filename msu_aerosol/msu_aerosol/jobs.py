@@ -0,0 +1,284 @@
+from datetime import datetime
+import json
+import threading
+from typing import Callable
+
+from flask import Flask
+from sqlalchemy import update
+
+from msu_aerosol.config import job_poll_interval, job_workers
+from msu_aerosol.exceptions import ColumnsMatchError, TimeFormatError
+from msu_aerosol.graph_funcs import (
+    preprocess_device_data,
+    preprocessing_one_file,
+    render_graphs,
+)
+from msu_aerosol.models import db, Device, Graph, Job
+
+__all__ = []
+
+# Обработчики задач по их виду. Обработчик получает задачу, ее параметры
+# и функцию report(доля, сообщение) для сообщения о ходе выполнения
+handlers: dict[str, Callable[[Job, dict, Callable], None]] = {}
+
+
+def job_handler(kind: str) -> Callable:
+    """
+    Декоратор, регистрирующий обработчик задач вида kind
+    :param kind: вид задачи
+    """
+
+    def register(func: Callable) -> Callable:
+        handlers[kind] = func
+        return func
+
+    return register
+
+
+def describe_error(error: Exception) -> str:
+    """
+    Функция, превращающая ошибку обработки в сообщение для пользователя
+    :param error: ошибка
+    """
+    if isinstance(error, TimeFormatError):
+        return 'Формат времени не подходит под столбец'
+    if isinstance(error, ColumnsMatchError):
+        return 'Обнаружено несовпадение столбцов'
+    if isinstance(error, ValueError):
+        return 'Невозможно предобработать данные по выбранным столбцам'
+    return f'Непредвиденная ошибка: {error.__class__.__name__}'
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач, хранящаяся в таблице jobs.
+    Задачи выполняются несколькими потоками; задачи одного прибора
+    не выполняются одновременно. Задачи, прерванные остановкой
+    сервера, при следующем запуске выполняются заново.
+    """
+
+    def __init__(self, workers: int, poll_interval: float) -> None:
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.app: Flask | None = None
+        self.threads: list[threading.Thread] = []
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+    def start(self, app: Flask) -> None:
+        """
+        Запуск потоков очереди.
+
+        :param app: Объект приложения для обращения к БД
+        :return: None
+        """
+
+        self.app = app
+        if self.threads:
+            return
+        with app.app_context():
+            db.session.execute(
+                update(Job)
+                .where(Job.status == 'running')
+                .values(status='queued', started=None),
+            )
+            db.session.commit()
+        self.stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self.work,
+                name=f'job_worker_{i}',
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        Остановка потоков после завершения текущих задач.
+
+        :return: None
+        """
+
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def enqueue(
+        self,
+        kind: str,
+        device_id: int | None = None,
+        user_id: int | None = None,
+        **payload,
+    ) -> Job:
+        """
+        Постановка задачи в очередь.
+
+        :param kind: Вид задачи (ключ в handlers)
+        :param device_id: Прибор, к которому относится задача
+        :param user_id: Пользователь, поставивший задачу
+        :param payload: Параметры задачи, сохраняются в JSON
+        :return: Созданная задача
+        """
+
+        if kind not in handlers:
+            raise ValueError(f'Неизвестный вид задачи: {kind}')
+        job = Job(
+            kind=kind,
+            device_id=device_id,
+            user_id=user_id,
+            payload=json.dumps(payload),
+            message='В очереди',
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.wakeup.set()
+        return job
+
+    def claim(self) -> int | None:
+        """
+        Выбор следующей задачи. Задача помечается выполняемой
+        одним запросом UPDATE, поэтому ее не возьмут два потока.
+
+        :return: Идентификатор задачи или None, если задач нет
+        """
+
+        busy = (
+            db.session.query(Job.device_id)
+            .filter(Job.status == 'running', Job.device_id.isnot(None))
+            .scalar_subquery()
+        )
+        while True:
+            candidate = (
+                db.session.query(Job.id)
+                .filter(
+                    Job.status == 'queued',
+                    Job.device_id.is_(None) | Job.device_id.notin_(busy),
+                )
+                .order_by(Job.id)
+                .first()
+            )
+            if candidate is None:
+                db.session.commit()
+                return None
+            claimed = db.session.execute(
+                update(Job)
+                .where(Job.id == candidate.id, Job.status == 'queued')
+                .values(
+                    status='running',
+                    started=datetime.now(),
+                    message='Выполняется',
+                ),
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return candidate.id
+
+    def report(self, job: Job, progress: float, message: str) -> None:
+        """
+        Сохранение хода выполнения задачи.
+
+        :param job: Задача
+        :param progress: Доля выполненной работы от 0 до 1
+        :param message: Текущий шаг
+        :return: None
+        """
+
+        job.progress = round(min(max(progress, 0), 1), 3)
+        job.message = message
+        db.session.commit()
+
+    def run(self, job_id: int) -> None:
+        """
+        Выполнение одной задачи и сохранение ее результата.
+
+        :param job_id: Идентификатор задачи
+        :return: None
+        """
+
+        job = Job.query.get(job_id)
+        try:
+            handlers[job.kind](
+                job,
+                json.loads(job.payload),
+                lambda progress, message: self.report(job, progress, message),
+            )
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.message = describe_error(e)
+        else:
+            job.status = 'done'
+            job.progress = 1
+            job.message = 'Готово'
+        job.finished = datetime.now()
+        db.session.commit()
+
+    def work(self) -> None:
+        """
+        Цикл потока: выполнение задач, пока они есть,
+        и ожидание новых.
+
+        :return: None
+        """
+
+        while not self.stopping.is_set():
+            with self.app.app_context():
+                job_id = self.claim()
+                if job_id is not None:
+                    self.run(job_id)
+                    continue
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+
+job_queue = JobQueue(job_workers, job_poll_interval)
+
+
+@job_handler('upload')
+def process_upload(job: Job, payload: dict, report: Callable) -> None:
+    """
+    Задача обработки файла, загруженного пользователем,
+    и перерисовки графиков прибора
+    :param job: задача
+    :param payload: graph_id - график, path - путь к файлу
+    :param report: функция сообщения о ходе выполнения
+    """
+    graph = Graph.query.get(payload['graph_id'])
+    report(0, 'Обработка файла')
+    preprocessing_one_file(graph, payload['path'], user_upload=True)
+    # Файлы-месяцы общие для всех графиков прибора,
+    # поэтому перерисовываются все его графики
+    graphs = graph.device.graphs
+    for i, device_graph in enumerate(graphs):
+        report(0.5 + 0.5 * i / len(graphs), f'Отрисовка {device_graph.name}')
+        render_graphs(device_graph)
+
+
+@job_handler('reprocess')
+def reprocess_device(job: Job, payload: dict, report: Callable) -> None:
+    """
+    Задача пред обработки всех данных прибора
+    и перерисовки измененных графиков
+    :param job: задача
+    :param payload: graph_ids - графики, которые нужно перерисовать
+    :param report: функция сообщения о ходе выполнения
+    """
+    device = Device.query.get(job.device_id)
+    graphs = [Graph.query.get(i) for i in payload['graph_ids']]
+    preprocess_device_data(
+        device,
+        progress=lambda done, total: report(
+            0.8 * done / total,
+            f'Обработано файлов: {done} из {total}',
+        ),
+    )
+    for i, graph in enumerate(graphs):
+        report(0.8 + 0.2 * i / len(graphs), f'Отрисовка {graph.name}')
+        render_graphs(graph)
+    device.show = True
+    for graph in graphs:
+        graph.created = True
+    db.session.commit()
@@ -205,6 +205,50 @@ class TimeColumn(BaseColumnModel):
     __tablename__ = 'time_columns'
 
 
+class Job(db.Model):
+    """
+    Таблица фоновых задач: обработка загруженных файлов
+    и пред обработка приборов после изменения настроек.
+    """
+
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String, nullable=False)
+    # Задачи одного прибора выполняются по очереди
+    device_id = db.Column(db.Integer, nullable=True, index=True)
+    # Параметры задачи в JSON
+    payload = db.Column(db.String, nullable=False, default='{}')
+    status = db.Column(db.String, nullable=False, default='queued', index=True)
+    # Доля выполненной работы от 0 до 1 и текущий шаг
+    progress = db.Column(db.Float, nullable=False, default=0)
+    message = db.Column(db.String, nullable=False, default='')
+    user_id = db.Column(db.Integer, nullable=True)
+    created = db.Column(db.DateTime, default=datetime.now)
+    started = db.Column(db.DateTime, nullable=True)
+    finished = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        """
+        Состояние задачи для ответа в JSON.
+
+        :return: Словарь с полями задачи
+        """
+
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'created': self.created and self.created.isoformat(),
+            'started': self.started and self.started.isoformat(),
+            'finished': self.finished and self.finished.isoformat(),
+        }
+
+    def __repr__(self) -> str:
+        return f'{self.kind} #{self.id}'
+
+
 class UserFieldView(ProtectedView):
     """
     Эти поля бут отображаться в админке в таблице пользователей.
@@ -269,3 +313,25 @@ class GraphView(ProtectedView):
         'columns',
         'time_format',
     )
+
+
+class JobView(ProtectedView):
+    """
+    Задачи в админке только просматриваются.
+    """
+
+    can_create = False
+    can_edit = False
+    can_delete = False
+    column_default_sort = ('id', True)
+    column_list = [
+        'id',
+        'kind',
+        'device_id',
+        'status',
+        'progress',
+        'message',
+        'created',
+        'started',
+        'finished',
+    ]
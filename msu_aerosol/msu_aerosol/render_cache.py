@@ -0,0 +1,164 @@
+import hashlib
+import json
+from pathlib import Path
+from threading import Lock
+
+import pandas as pd
+
+from msu_aerosol.fragments import find_fragment, graphs_path
+from msu_aerosol.rollups import tiers
+from msu_aerosol.storage import dump_json, load_index
+
+__all__ = []
+
+# Отпечатки последних успешных отрисовок хранятся рядом с графиками,
+# поэтому переживают перезапуск сервера
+render_cache_name = 'render_cache.json'
+# Виды, которые записываются вместе с видом графика
+companion_views = {'recent': ('sparkline',)}
+
+
+def input_versions(
+    device_name: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+) -> list[list]:
+    """
+    Функция, возвращающая версии файлов-месяцев прибора, из которых
+    может быть отрисован промежуток: исходных данных и всех агрегатов
+    :param device_name: имя прибора
+    :param start: начало промежутка
+    :param end: конец промежутка
+    :return: список [уровень, файл, время изменения, число строк]
+    """
+    versions = []
+    for tier in (None, *tiers):
+        for entry in load_index(device_name, tier).values():
+            if (
+                not entry['rows']
+                or pd.Timestamp(entry['max']) < start
+                or pd.Timestamp(entry['min']) > end
+            ):
+                continue
+            versions.append(
+                [tier, entry['file'], entry['mtime_ns'], entry['rows']],
+            )
+    return versions
+
+
+def render_key(
+    device_name: str,
+    settings: list,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+) -> str:
+    """
+    Функция, считающая отпечаток входных данных отрисовки
+    :param device_name: имя прибора
+    :param settings: настройки графика, от которых зависит отрисовка
+    :param start: начало промежутка
+    :param end: конец промежутка
+    :return: SHA-256 версий файлов, настроек и промежутка
+    """
+    content = json.dumps(
+        [
+            input_versions(device_name, start, end),
+            settings,
+            start.isoformat(),
+            end.isoformat(),
+        ],
+        default=str,
+    )
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Кэш отпечатков отрисованных графиков.
+    Если отпечаток входных данных совпадает с отпечатком последней
+    успешной отрисовки и график на месте, отрисовка пропускается.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.entries: dict[str, str] | None = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def get_key(graph_name: str, view: str) -> str:
+        return f'{view}/{graph_name}'
+
+    def load(self) -> dict[str, str]:
+        if self.entries is None:
+            try:
+                with self.path.open('r') as f:
+                    self.entries = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.entries = {}
+        return self.entries
+
+    def fresh(self, graph_name: str, view: str, fingerprint: str) -> bool:
+        """
+        Проверка, можно ли не отрисовывать вид графика.
+
+        :param graph_name: Имя графика
+        :param view: Вид графика (full или recent)
+        :param fingerprint: Отпечаток входных данных отрисовки
+        :return: True, если график отрисован по тем же данным
+        """
+
+        with self.lock:
+            stored = self.load().get(self.get_key(graph_name, view))
+        hit = stored == fingerprint and all(
+            find_fragment(graph_name, i)
+            for i in (view, *companion_views.get(view, ()))
+        )
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def put(self, graph_name: str, view: str, fingerprint: str) -> None:
+        """
+        Сохранение отпечатка успешной отрисовки.
+
+        :param graph_name: Имя графика
+        :param view: Вид графика (full или recent)
+        :param fingerprint: Отпечаток входных данных отрисовки
+        :return: None
+        """
+
+        with self.lock:
+            self.load()[self.get_key(graph_name, view)] = fingerprint
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            dump_json(self.path, self.entries)
+
+    def stats(self) -> dict:
+        """
+        Счетчики кэша для оценки числа пропущенных отрисовок.
+
+        :return: Словарь с теми же ключами, что у кэша файлов-месяцев
+        """
+
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else None,
+                'evictions': 0,
+                'entries': len(self.load()),
+                'size_mb': (
+                    self.path.stat().st_size / 2**20
+                    if self.path.exists()
+                    else 0
+                ),
+                'max_mb': None,
+            }
+
+
+render_cache = RenderCache(Path(graphs_path, render_cache_name))
@@ -0,0 +1,204 @@
+import pandas as pd
+
+from msu_aerosol.storage import (
+    load_index,
+    load_meta,
+    partition_path,
+    read_range,
+    time_col,
+    upsert_partition,
+)
+
+__all__ = []
+
+# Уровни агрегатов от мелкого к крупному и ширина их корзин.
+# Первый уровень считается по исходным данным, остальные - по предыдущему
+tiers = {
+    '1min': pd.Timedelta(minutes=1),
+    '10min': pd.Timedelta(minutes=10),
+    '1h': pd.Timedelta(hours=1),
+    '1d': pd.Timedelta(days=1),
+}
+# Для каждого столбца хранится среднее (под его же именем),
+# а также минимум, максимум и число значений в корзине
+stats = ('min', 'max', 'count')
+
+
+def stat_col(col: str, stat: str) -> str:
+    return f'{col}:{stat}'
+
+
+def base_columns(df: pd.DataFrame) -> list[str]:
+    return [col for col in df.columns if col != time_col and ':' not in col]
+
+
+def aggregate_raw(df: pd.DataFrame, width: pd.Timedelta) -> pd.DataFrame:
+    """
+    Функция, считающая агрегаты исходных данных по корзинам
+    :param df: исходные данные с временным столбцом timestamp
+    :param width: ширина корзины
+    :return: агрегаты, по строке на каждую непустую корзину
+    """
+    columns = base_columns(df)
+    grouped = df.groupby(df[time_col].dt.floor(width))[columns]
+    result = pd.concat(
+        [
+            grouped.mean().astype('float32'),
+            grouped.min().rename(columns=lambda c: stat_col(c, 'min')),
+            grouped.max().rename(columns=lambda c: stat_col(c, 'max')),
+            grouped.count().rename(columns=lambda c: stat_col(c, 'count')),
+        ],
+        axis=1,
+    )
+    return finish(result, columns)
+
+
+def aggregate_tier(df: pd.DataFrame, width: pd.Timedelta) -> pd.DataFrame:
+    """
+    Функция, считающая агрегаты по агрегатам более мелкого уровня:
+    средние взвешиваются по числу значений
+    :param df: агрегаты более мелкого уровня
+    :param width: ширина корзины
+    :return: агрегаты, по строке на каждую непустую корзину
+    """
+    columns = base_columns(df)
+    counts = df[[stat_col(col, 'count') for col in columns]].to_numpy()
+    weighted = pd.DataFrame(
+        df[columns].to_numpy(dtype='float64') * counts,
+        columns=columns,
+        index=df.index,
+    ).fillna(0)
+    key = df[time_col].dt.floor(width)
+    count = df.groupby(key)[[stat_col(col, 'count') for col in columns]].sum()
+    mean = weighted.groupby(key).sum() / count.to_numpy()
+    result = pd.concat(
+        [
+            mean.astype('float32'),
+            df.groupby(key)[[stat_col(col, 'min') for col in columns]].min(),
+            df.groupby(key)[[stat_col(col, 'max') for col in columns]].max(),
+            count,
+        ],
+        axis=1,
+    )
+    return finish(result, columns)
+
+
+def finish(result: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """
+    Функция, убирающая корзины без значений (в них были только пропуски)
+    и упорядочивающая столбцы агрегатов
+    """
+    counts = result[[stat_col(col, 'count') for col in columns]]
+    result = result[counts.sum(axis=1) > 0]
+    order = columns + [
+        stat_col(col, stat) for col in columns for stat in stats
+    ]
+    return result[order].rename_axis(time_col).reset_index()
+
+
+def write_tier(device_name: str, tier: str, df: pd.DataFrame) -> None:
+    """
+    Функция, записывающая корзины уровня в его файлы-месяцы
+    :param device_name: имя прибора
+    :param tier: уровень агрегатов
+    :param df: пересчитанные корзины
+    """
+    columns = list(df.columns)
+    period = df[time_col].dt.year * 100 + df[time_col].dt.month
+    for key, df_month in df.groupby(period, sort=True):
+        upsert_partition(
+            partition_path(device_name, key // 100, key % 100, tier),
+            df_month,
+            columns,
+        )
+
+
+def update_rollups(
+    device_name: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+) -> None:
+    """
+    Функция, пересчитывающая агрегаты прибора после обработки новых строк.
+    Пересчитываются только корзины, в которые попали строки из промежутка
+    [start, end], поэтому повторная обработка строк их не искажает
+    :param device_name: имя прибора
+    :param start: время первой обработанной строки
+    :param end: время последней обработанной строки
+    """
+    previous = None
+    for tier, width in tiers.items():
+        first = start.floor(width)
+        last = end.floor(width) + width - pd.Timedelta(1, 'ns')
+        df = read_range(device_name, start=first, end=last, tier=previous)
+        df = df.dropna(subset=[time_col])
+        if df.empty:
+            return
+        result = (
+            aggregate_raw(df, width)
+            if previous is None
+            else aggregate_tier(df, width)
+        )
+        if not result.empty:
+            write_tier(device_name, tier, result)
+        previous = tier
+
+
+def rebuild_rollups(device_name: str) -> None:
+    """
+    Функция, пересчитывающая все агрегаты прибора по исходным данным.
+    Пересчет идет по файлам-месяцам, поэтому вся история прибора
+    в память не считывается
+    :param device_name: имя прибора
+    """
+    for entry in load_index(device_name).values():
+        if entry['rows']:
+            update_rollups(
+                device_name,
+                pd.Timestamp(entry['min']),
+                pd.Timestamp(entry['max']),
+            )
+
+
+def tier_covers(device_name: str, tier: str, start: pd.Timestamp) -> bool:
+    """
+    Проверка, что агрегаты уровня построены с начала промежутка.
+    Для данных, обработанных до появления агрегатов, их нет,
+    пока они не пересчитаны командой build-rollups
+    :param device_name: имя прибора
+    :param tier: уровень агрегатов
+    :param start: начало промежутка
+    :return: True, если первая корзина уровня не позже начала промежутка
+    (или начала исходных данных, если они начинаются позже)
+    """
+    first = load_meta(device_name)['first']
+    if first is None:
+        return True
+    minimums = [
+        pd.Timestamp(entry['min'])
+        for entry in load_index(device_name, tier).values()
+        if entry['rows']
+    ]
+    needed = max(start, pd.Timestamp(first)).floor(tiers[tier])
+    return bool(minimums) and min(minimums) <= needed
+
+
+def choose_tier(
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    max_points: int,
+) -> str | None:
+    """
+    Функция, выбирающая самый крупный уровень агрегатов,
+    который еще дает max_points точек на промежутке
+    :param start: начало промежутка
+    :param end: конец промежутка
+    :param max_points: сколько точек нужно
+    :return: уровень агрегатов или None, если нужны исходные данные
+    """
+    resolution = (end - start) / max(max_points, 1)
+    chosen = None
+    for tier, width in tiers.items():
+        if width <= resolution:
+            chosen = tier
+    return chosen
@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from msu_aerosol.config import downsampling_method, graph_max_points
+from msu_aerosol.downsampling import downsample_frame
+from msu_aerosol.exceptions import SeriesRequestError
+from msu_aerosol.figures import encode_array, encode_time
+from msu_aerosol.graph_funcs import read_plot_range
+from msu_aerosol.models import Graph
+from msu_aerosol.storage import load_meta, time_col
+
+__all__ = []
+
+# Больше точек на линию API не отдает: иначе ответ по размеру
+# приближается к скачиванию исходных данных, для которого нужна роль
+max_points_limit = 20000
+# Промежуток по умолчанию такой же, как у полного графика
+default_span = timedelta(days=14)
+# Как кодируются массивы: json - обычные списки,
+# typed - типизированные массивы plotly.js ({dtype, bdata} в base64)
+encodings = ('json', 'typed')
+
+
+def parse_time(value: str | None) -> pd.Timestamp | None:
+    """
+    Функция, разбирающая границу промежутка из запроса
+    :param value: время в формате ISO 8601 или None
+    :return: время без часового пояса или None
+    """
+    if not value:
+        return None
+    try:
+        return pd.Timestamp(value).tz_localize(None)
+    except ValueError:
+        raise SeriesRequestError(f'Неверное время: {value}')
+
+
+def parse_max_points(value: str | None) -> int:
+    """
+    Функция, разбирающая число точек из запроса
+    :param value: число точек или None (по умолчанию graph_max_points)
+    :return: число точек от 3 до max_points_limit
+    """
+    if not value:
+        return graph_max_points
+    try:
+        max_points = int(value)
+    except ValueError:
+        raise SeriesRequestError(f'Неверное число точек: {value}')
+    return min(max(max_points, 3), max_points_limit)
+
+
+def series_payload(
+    graph: Graph,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    max_points: int = graph_max_points,
+    columns: list[str] | None = None,
+    encoding: str = 'json',
+) -> dict:
+    """
+    Функция, собирающая прореженные данные графика в столбцовом виде
+    :param graph: объект записи в БД из таблицы graphs
+    :param start: начало промежутка (по умолчанию за 14 дней до end)
+    :param end: конец промежутка (по умолчанию последнее измерение)
+    :param max_points: сколько точек оставить в каждой линии
+    :param columns: какие столбцы отдать (по умолчанию все столбцы графика)
+    :param encoding: json или typed
+    :return: словарь с промежутком и линиями по столбцам
+    """
+    if encoding not in encodings:
+        raise SeriesRequestError(f'Неизвестная кодировка: {encoding}')
+    graph_columns = {i.name: i for i in graph.columns if i.use}
+    columns = columns or list(graph_columns)
+    unknown = [col for col in columns if col not in graph_columns]
+    if unknown:
+        raise SeriesRequestError(f'Нет столбцов: {", ".join(unknown)}')
+    if end is None:
+        last = load_meta(graph.device.name)['last']
+        if last is None:
+            raise FileNotFoundError(graph.device.name)
+        end = pd.Timestamp(last)
+    if start is None:
+        start = end - default_span
+    if start > end:
+        raise SeriesRequestError('Начало промежутка позже конца')
+
+    df = read_plot_range(graph.device.name, start, end, max_points)
+    # За промежуток без данных столбцов графика может не быть
+    df = df.reindex(columns=[time_col] + columns)
+    df = df.drop_duplicates(subset=[time_col]).sort_values(by=time_col)
+    df = df[(start <= df[time_col]) & (df[time_col] <= end)]
+    # Столбцы умножаются на коэффициенты так же, как на графиках
+    df = df.assign(
+        **{col: df[col] * graph_columns[col].coefficient for col in columns},
+    )
+    plot_data = downsample_frame(
+        df,
+        time_col,
+        columns,
+        max_points,
+        downsampling_method,
+    )
+    series = {}
+    for col in columns:
+        column = graph_columns[col]
+        trace = plot_data[plot_data['variable'] == col]
+        series[col] = {
+            'name': (
+                col
+                if column.coefficient == 1
+                else f'{col} * {column.coefficient}'
+            ),
+            'color': column.color,
+            'visible': bool(column.default),
+            'x': encode_time(trace[time_col].to_numpy(), encoding),
+            'y': encode_array(trace['value'].to_numpy(), encoding),
+        }
+    return {
+        'graph': graph.id,
+        'device': graph.device.name,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'max_points': max_points,
+        'encoding': encoding,
+        'columns': series,
+    }
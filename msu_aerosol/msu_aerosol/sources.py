@@ -0,0 +1,344 @@
+from abc import ABC, abstractmethod
+import asyncio
+from datetime import datetime, timezone
+from http import HTTPStatus
+import os
+from pathlib import Path
+import random
+import shutil
+from threading import Lock, Thread
+import time
+from typing import Any, AsyncIterator, Coroutine, Iterator
+
+import httpx
+import requests
+from yadisk import AsyncYaDisk, YaDisk
+from yadisk.exceptions import InternalServerError, YaDiskConnectionError
+from yadisk.sessions.async_httpx_session import AsyncHTTPXSession
+
+from msu_aerosol.config import (
+    data_source,
+    download_concurrency,
+    local_source_failure_rate,
+    local_source_latency,
+    local_source_root,
+    yadisk_token,
+)
+from msu_aerosol.exceptions import SourceError
+
+__all__ = []
+
+# Сколько файлов запрашивается из источника за один раз
+listing_page_size = 1000
+
+
+class AsyncTransfer:
+    """
+    Фоновый цикл событий для асинхронного скачивания файлов.
+    Работает в отдельном потоке, поэтому клиенты источников
+    и их пулы соединений переиспользуются между вызовами,
+    а число одновременных скачиваний ограничено семафором.
+    """
+
+    def __init__(self, max_connections: int) -> None:
+        self.max_connections = max(max_connections, 1)
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.semaphore: asyncio.Semaphore | None = None
+        self.lock = Lock()
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.semaphore = asyncio.Semaphore(self.max_connections)
+                Thread(
+                    target=self.loop.run_forever,
+                    name='source-transfer',
+                    daemon=True,
+                ).start()
+            return self.loop
+
+    def run(self, coro: Coroutine) -> Any:
+        """
+        Выполнение корутины в цикле событий.
+
+        :param coro: Корутина
+        :return: Результат корутины
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop()).result()
+
+
+transfer = AsyncTransfer(download_concurrency)
+
+
+class DataSource(ABC):
+    """
+    Источник исходных файлов приборов.
+    Файл описывается словарем с ключами name, modified, size, md5
+    и file (ссылка, по которой файл скачивается).
+    При любой ошибке источника выбрасывается SourceError.
+    Источник, в котором реализованы не все методы, не создается.
+    """
+
+    @abstractmethod
+    def iter_items(self, link: str) -> Iterator[dict]:
+        """
+        Постраничный перебор файлов в папке прибора.
+
+        :param link: Ссылка на папку прибора
+        """
+
+    @abstractmethod
+    def aiter_items(self, link: str) -> AsyncIterator[dict]:
+        """
+        Асинхронный вариант iter_items, выполняется в цикле transfer.
+
+        :param link: Ссылка на папку прибора
+        """
+
+    @abstractmethod
+    def download(self, item: dict, file_path: str) -> None:
+        """
+        Скачивание файла целиком.
+
+        :param item: Объект файла
+        :param file_path: Куда сохранить файл
+        """
+
+    def download_tail(self, item: dict, file_path: str) -> bool:
+        """
+        Докачивание в локальную копию файла байтов после ее конца.
+
+        :param item: Объект файла
+        :param file_path: Путь к локальной копии файла
+        :return: Удалось ли докачать (False - источник так не умеет)
+        """
+        return False
+
+    @abstractmethod
+    async def adownload(self, item: dict, file_path: str) -> None:
+        """
+        Асинхронное скачивание файла целиком, выполняется в цикле transfer.
+
+        :param item: Объект файла
+        :param file_path: Куда сохранить файл
+        """
+
+
+class YandexDiskSource(DataSource):
+    """
+    Папки приборов в Я.Диске, link - публичная ссылка на папку.
+    """
+
+    def __init__(self, token: str) -> None:
+        self.token = token
+        self.disk = YaDisk(token=token)
+        self.async_disk: AsyncYaDisk | None = None
+
+    def get_async_disk(self) -> AsyncYaDisk:
+        """
+        Асинхронный клиент создается внутри цикла событий
+        при первом обращении и живет, пока работает приложение.
+        """
+        if self.async_disk is None:
+            limits = httpx.Limits(
+                max_connections=transfer.max_connections,
+                max_keepalive_connections=transfer.max_connections,
+            )
+            self.async_disk = AsyncYaDisk(
+                token=self.token,
+                session=AsyncHTTPXSession(limits=limits),
+            )
+        return self.async_disk
+
+    def iter_items(self, link: str) -> Iterator[dict]:
+        offset = 0
+        while True:
+            try:
+                items = self.disk.get_public_meta(
+                    link,
+                    limit=listing_page_size,
+                    offset=offset,
+                )['embedded']['items']
+            except (InternalServerError, YaDiskConnectionError) as e:
+                raise SourceError(str(e)) from e
+            yield from items
+            if len(items) < listing_page_size:
+                return
+            offset += len(items)
+
+    async def aiter_items(self, link: str) -> AsyncIterator[dict]:
+        disk = self.get_async_disk()
+        offset = 0
+        while True:
+            try:
+                items = (
+                    await disk.get_public_meta(
+                        link,
+                        limit=listing_page_size,
+                        offset=offset,
+                    )
+                )['embedded']['items']
+            except (InternalServerError, YaDiskConnectionError) as e:
+                raise SourceError(str(e)) from e
+            for item in items:
+                yield item
+            if len(items) < listing_page_size:
+                return
+            offset += len(items)
+
+    def download(self, item: dict, file_path: str) -> None:
+        try:
+            self.disk.download_by_link(item['file'], file_path)
+        except (InternalServerError, YaDiskConnectionError) as e:
+            raise SourceError(str(e)) from e
+
+    def download_tail(self, item: dict, file_path: str) -> bool:
+        local_size = Path(file_path).stat().st_size
+        try:
+            response = requests.get(
+                item['file'],
+                headers={'Range': f'bytes={local_size}-'},
+                stream=True,
+                timeout=60,
+            )
+        except requests.RequestException:
+            return False
+        with response:
+            # Сервер, не поддерживающий диапазоны, вернет файл целиком
+            if response.status_code != HTTPStatus.PARTIAL_CONTENT:
+                return False
+            try:
+                with Path(file_path).open('ab') as f:
+                    for chunk in response.iter_content(chunk_size=1 << 16):
+                        f.write(chunk)
+            except requests.RequestException:
+                # Копия с недокачанным концом удаляется,
+                # и файл скачивается заново целиком
+                Path(file_path).unlink(missing_ok=True)
+                return False
+        return True
+
+    async def adownload(self, item: dict, file_path: str) -> None:
+        try:
+            await self.get_async_disk().download_by_link(
+                item['file'],
+                file_path,
+                headers={'Connection': 'keep-alive'},
+                n_retries=0,
+            )
+        except (InternalServerError, YaDiskConnectionError) as e:
+            raise SourceError(str(e)) from e
+
+
+class LocalDirectorySource(DataSource):
+    """
+    Папки приборов в локальной директории, link - путь к папке
+    относительно root. Нужен для тестов и нагрузочных замеров без сети:
+    каждый запрос может задерживаться на latency секунд
+    и завершаться ошибкой с вероятностью failure_rate.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        latency: float = 0,
+        failure_rate: float = 0,
+        seed: int | None = None,
+    ) -> None:
+        self.root = Path(root)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    def should_fail(self) -> bool:
+        return self.random.random() < self.failure_rate
+
+    def request(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.should_fail():
+            raise SourceError('Имитация ошибки источника')
+
+    async def arequest(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.should_fail():
+            raise SourceError('Имитация ошибки источника')
+
+    def list_page(self, link: str, offset: int) -> list[dict]:
+        folder = self.root / link
+        if not folder.is_dir():
+            raise SourceError(f'Папка {folder} не найдена')
+        items = []
+        for path in sorted(folder.iterdir())[offset:][:listing_page_size]:
+            stat = path.stat()
+            items.append(
+                {
+                    'name': path.name,
+                    'modified': datetime.fromtimestamp(
+                        stat.st_mtime,
+                        tz=timezone.utc,
+                    ),
+                    'size': stat.st_size,
+                    'md5': None,
+                    'file': str(path),
+                },
+            )
+        return items
+
+    def iter_items(self, link: str) -> Iterator[dict]:
+        offset = 0
+        while True:
+            self.request()
+            items = self.list_page(link, offset)
+            yield from items
+            if len(items) < listing_page_size:
+                return
+            offset += len(items)
+
+    async def aiter_items(self, link: str) -> AsyncIterator[dict]:
+        offset = 0
+        while True:
+            await self.arequest()
+            items = self.list_page(link, offset)
+            for item in items:
+                yield item
+            if len(items) < listing_page_size:
+                return
+            offset += len(items)
+
+    def download(self, item: dict, file_path: str) -> None:
+        self.request()
+        shutil.copyfile(item['file'], file_path)
+
+    def download_tail(self, item: dict, file_path: str) -> bool:
+        self.request()
+        with Path(item['file']).open('rb') as src:
+            src.seek(Path(file_path).stat().st_size)
+            with Path(file_path).open('ab') as dst:
+                shutil.copyfileobj(src, dst)
+        return True
+
+    async def adownload(self, item: dict, file_path: str) -> None:
+        await self.arequest()
+        await asyncio.to_thread(shutil.copyfile, item['file'], file_path)
+
+
+def make_source(name: str = data_source) -> DataSource:
+    """
+    Функция, создающая источник данных по его названию из настроек.
+
+    :param name: yandex или local
+    :return: Источник данных
+    """
+    if name == 'local':
+        return LocalDirectorySource(
+            os.path.expanduser(local_source_root),
+            latency=local_source_latency,
+            failure_rate=local_source_failure_rate,
+        )
+    return YandexDiskSource(yadisk_token)
+
+
+source = make_source()
@@ -0,0 +1,104 @@
+from html import escape
+
+import numpy as np
+import pandas as pd
+
+from msu_aerosol.models import VariableColumn
+
+__all__ = []
+
+# Размер миниатюры в единицах viewBox; на странице она растягивается
+# по ширине карточки с сохранением пропорций
+sparkline_width = 600
+sparkline_height = 200
+# Отступы под подписи промежутка и наибольшего значения
+sparkline_padding = 16
+# Больше точек на линию миниатюры не различить
+sparkline_points = 300
+
+
+def sparkline_path(x: np.ndarray, y: np.ndarray) -> str:
+    """
+    Функция, строящая линию миниатюры. Пропуски разрывают линию
+    :param x: координаты точек по горизонтали
+    :param y: координаты точек по вертикали (NaN - пропуск)
+    :return: значение атрибута d элемента path
+    """
+    commands = []
+    move = True
+    for x_i, y_i in zip(x.tolist(), y.tolist()):
+        if np.isnan(y_i):
+            move = True
+            continue
+        commands.append(f'{"M" if move else "L"}{x_i:.1f},{y_i:.1f}')
+        move = False
+    return ''.join(commands)
+
+
+def sparkline_svg(
+    plot_data: pd.DataFrame,
+    time_col: str,
+    columns: list[VariableColumn],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+) -> str:
+    """
+    Функция, рисующая миниатюру графика в SVG без plotly.
+    Рисуются только столбцы, видимые на графике по умолчанию,
+    цветами из настроек столбцов, на общей оси значений
+    :param plot_data: прореженные данные в длинном формате
+    (time_col, variable, value)
+    :param time_col: временной столбец
+    :param columns: отрисовываемые столбцы графика
+    :param start: левая граница оси времени
+    :param end: правая граница оси времени
+    :return: SVG миниатюры
+    """
+    visible = [i for i in columns if i.default]
+    lines = {
+        i.name: plot_data[plot_data['variable'] == i.name] for i in visible
+    }
+    values = np.concatenate(
+        [line['value'].to_numpy(dtype='float64') for line in lines.values()]
+        or [np.array([])],
+    )
+    values = values[~np.isnan(values)]
+    low = min(values.min(), 0) if len(values) else 0
+    high = values.max() if len(values) else 1
+    if high <= low:
+        high = low + 1
+    span = max((end - start).total_seconds(), 1)
+    width = sparkline_width
+    height = sparkline_height - 2 * sparkline_padding
+    elements = []
+    for i in visible:
+        line = lines[i.name]
+        seconds = (line[time_col] - start).dt.total_seconds().to_numpy()
+        x = seconds / span * width
+        y = (
+            sparkline_padding
+            + (
+                1
+                - (line['value'].to_numpy(dtype='float64') - low)
+                / (high - low)
+            )
+            * height
+        )
+        elements.append(
+            f'<path d="{sparkline_path(x, y)}" fill="none" '
+            f'stroke="{escape(i.color or "black")}" stroke-width="1.5">'
+            f'<title>{escape(i.name)}</title></path>',
+        )
+    labels = [
+        f'<text x="0" y="{sparkline_padding - 4}">{high:.4g}</text>',
+        f'<text x="0" y="{sparkline_height - 2}">'
+        f'{start:%d.%m.%Y %H:%M}</text>',
+        f'<text x="{width}" y="{sparkline_height - 2}" text-anchor="end">'
+        f'{end:%d.%m.%Y %H:%M}</text>',
+    ]
+    return (
+        f'<svg class="sparkline" xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="0 0 {width} {sparkline_height}" '
+        f'font-size="12" font-family="sans-serif">'
+        f'{"".join(elements)}{"".join(labels)}</svg>'
+    )
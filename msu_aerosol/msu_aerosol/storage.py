@@ -0,0 +1,623 @@
+from collections import OrderedDict
+from datetime import datetime
+import json
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from msu_aerosol.config import partition_cache_mb
+
+__all__ = []
+
+proc_data_path = 'proc_data'
+time_col = 'timestamp'
+# Файлы-месяцы хранятся в Parquet, старые CSV-файлы только читаются
+partition_suffix = '.parquet'
+legacy_suffix = '.csv'
+# Индекс файлов-месяцев прибора: границы времени и число строк каждого
+index_name = 'index.json'
+# Сводка по прибору: первое и последнее время, число строк
+# и время последней обработки, чтобы не читать ради них данные
+meta_name = 'meta.json'
+# Агрегаты прибора хранятся в подпапках rollup_<уровень> папки прибора
+rollup_prefix = 'rollup_'
+index_lock = Lock()
+
+
+def device_folder(device_name: str, tier: str | None = None) -> Path:
+    """
+    Функция, возвращающая папку с файлами-месяцами прибора
+    :param device_name: имя прибора
+    :param tier: уровень агрегатов (по умолчанию исходные данные)
+    """
+    if tier is None:
+        return Path(proc_data_path, device_name)
+    return Path(proc_data_path, device_name, f'{rollup_prefix}{tier}')
+
+
+def partition_path(
+    device_name: str,
+    year: int,
+    month: int,
+    tier: str | None = None,
+) -> Path:
+    """
+    Функция, возвращающая путь к файлу-месяцу прибора
+    :param device_name: имя прибора
+    :param year: год
+    :param month: месяц
+    :param tier: уровень агрегатов (по умолчанию исходные данные)
+    """
+    return (
+        device_folder(device_name, tier)
+        / f'{year}_{month:02d}{partition_suffix}'
+    )
+
+
+def list_partitions(
+    device_name: str,
+    tier: str | None = None,
+) -> dict[str, Path]:
+    """
+    Функция, возвращающая файлы-месяцы прибора.
+    Если месяц есть и в Parquet, и в CSV, берется Parquet
+    :param device_name: имя прибора
+    :param tier: уровень агрегатов (по умолчанию исходные данные)
+    :return: словарь вида {YYYY_MM: путь}, отсортированный по месяцам
+    """
+    folder = device_folder(device_name, tier)
+    if not folder.exists():
+        return {}
+    partitions: dict[str, Path] = {}
+    for path in sorted(folder.iterdir()):
+        if path.suffix == partition_suffix or (
+            path.suffix == legacy_suffix and path.stem not in partitions
+        ):
+            partitions[path.stem] = path
+    return dict(sorted(partitions.items()))
+
+
+def compact_column(values: pd.Series) -> pd.Series:
+    """
+    Функция, переводящая числовой столбец в float32,
+    если десятичная запись ни одного значения от этого не меняется,
+    иначе в float64. Целочисленные столбцы (например, число значений
+    в агрегатах) не меняются
+    :param values: числовой столбец
+    """
+    if pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(
+        values,
+    ):
+        return values
+    values = values.astype('float64')
+    narrow = values.astype('float32')
+    original = values.to_numpy()
+    widened = narrow.to_numpy().astype('float64')
+    # float32 печатается кратчайшей записью, однозначно задающей число
+    # (не длиннее 9 значащих цифр), поэтому значение сохраняется,
+    # если округление float32 до какого-то числа значащих цифр
+    # дает исходное число
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponent = np.floor(np.log10(np.abs(widened)))
+    exponent = np.where(np.isfinite(exponent), exponent, 0)
+    kept = np.isnan(original) | (widened == original)
+    for digits in range(1, 10):
+        if kept.all():
+            return narrow
+        # Степени десяти до 10^22 точны, поэтому деление и умножение
+        # целого числа на них округляются так же, как разбор записи
+        scale = digits - 1 - exponent
+        power = 10.0 ** np.abs(scale)
+        restored = np.where(
+            scale >= 0,
+            np.round(widened * power) / power,
+            np.round(widened / power) * power,
+        )
+        kept |= restored == original
+    if kept.all():
+        return narrow
+    return values
+
+
+def to_numeric(
+    df: pd.DataFrame,
+    columns: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Функция, приводящая столбцы данных к компактным числовым типам
+    (в том числе записанные с десятичной запятой).
+    Вызывается для новых строк при обработке файла:
+    файлы-месяцы хранят уже приведенные столбцы
+    :param df: датафрейм
+    :param columns: какие столбцы привести
+    (по умолчанию все, кроме временного столбца timestamp)
+    """
+    df = df.copy()
+    if columns is None:
+        columns = [col for col in df.columns if col != time_col]
+    for col in columns:
+        values = df[col]
+        if values.dtype == 'float32':
+            continue
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(
+                values.astype('string').str.replace(',', '.', regex=False),
+                errors='coerce',
+            )
+        df[col] = compact_column(values)
+    return df
+
+
+def decode_partition(
+    path: Path,
+    columns: list[str] | None = None,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    """
+    Функция, считывающая файл-месяц с диска
+    :param path: путь к файлу-месяцу (Parquet или CSV)
+    :param columns: какие столбцы данных считать (по умолчанию все)
+    :param start: с какого времени считывать строки
+    :param end: по какое время считывать строки
+    :return: датафрейм с временным столбцом timestamp
+    """
+    selected = None if columns is None else [time_col] + columns
+    filters = []
+    if start is not None:
+        filters.append((time_col, '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append((time_col, '<=', pd.Timestamp(end)))
+    if path.suffix == partition_suffix:
+        return pq.read_table(
+            path,
+            columns=selected,
+            filters=filters or None,
+        ).to_pandas()
+    df = to_numeric(
+        pd.read_csv(path, usecols=selected, parse_dates=[time_col]),
+    )
+    return select_rows(df, start, end)
+
+
+def select_rows(
+    df: pd.DataFrame,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df[time_col] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df[time_col] <= pd.Timestamp(end)
+    return df[mask].reset_index(drop=True)
+
+
+class PartitionCache:
+    """
+    LRU-кэш считанных файлов-месяцев, ограниченный по памяти.
+    Ключ - прибор и месяц, к записи прилагается версия файла
+    (имя, время изменения и размер): если файл переписан,
+    запись считается устаревшей и файл считывается заново.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def get_key(path: Path) -> tuple[str, str]:
+        return str(path.parent), path.stem
+
+    @staticmethod
+    def get_version(path: Path) -> tuple[str, int, int]:
+        stat = path.stat()
+        return path.name, stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: Path) -> pd.DataFrame:
+        """
+        Файл-месяц из кэша или, если его там нет, с диска.
+        Возвращаемый датафрейм нельзя изменять.
+
+        :param path: Путь к файлу-месяцу
+        :return: Все строки и столбцы файла
+        """
+        key, version = self.get_key(path), self.get_version(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        df = decode_partition(path)
+        self.put(path, df, version)
+        return df
+
+    def put(
+        self,
+        path: Path,
+        df: pd.DataFrame,
+        version: tuple[str, int, int] | None = None,
+    ) -> None:
+        """
+        Сохранение файла-месяца в кэш.
+
+        :param path: Путь к файлу-месяцу
+        :param df: Все строки и столбцы файла
+        :param version: Версия файла, по умолчанию текущая
+        """
+        if version is None:
+            version = self.get_version(path)
+        key = self.get_key(path)
+        nbytes = int(df.memory_usage(index=True).sum())
+        with self.lock:
+            self.discard(key)
+            if nbytes > self.max_bytes:
+                return
+            self.entries[key] = (version, df, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                self.discard(next(iter(self.entries)))
+                self.evictions += 1
+
+    def discard(self, key: tuple[str, str]) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """
+        Счетчики кэша для подбора его размера.
+
+        :return: Словарь с числом попаданий, промахов, вытеснений,
+        записей и занятой памятью
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else None,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size_mb': self.size / 2**20,
+                'max_mb': self.max_bytes / 2**20,
+            }
+
+
+partition_cache = PartitionCache(partition_cache_mb * 2**20)
+
+
+def read_partition(
+    path: str | Path,
+    columns: list[str] | None = None,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    """
+    Функция, считывающая файл-месяц (через кэш, если он включен)
+    :param path: путь к файлу-месяцу (Parquet или CSV)
+    :param columns: какие столбцы данных считать (по умолчанию все)
+    :param start: с какого времени считывать строки
+    :param end: по какое время считывать строки
+    :return: датафрейм с временным столбцом timestamp
+    """
+    path = Path(path)
+    if not partition_cache.max_bytes:
+        return decode_partition(path, columns, start, end)
+    df = partition_cache.get(path)
+    if columns is not None:
+        df = df[[time_col] + columns]
+    # Выборка строк возвращает копию, поэтому данные в кэше не меняются
+    return select_rows(df, start, end)
+
+
+def write_partition(path: str | Path, df: pd.DataFrame) -> None:
+    """
+    Функция, записывающая файл-месяц в Parquet.
+    Запись идет во временный файл, который затем заменяет старый,
+    поэтому читатели никогда не видят наполовину записанный файл.
+    Типы столбцов записываются как есть
+    :param path: путь к файлу-месяцу
+    :param df: датафрейм с временным столбцом timestamp
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = df.reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    pq.write_table(table, tmp_path, compression='zstd')
+    tmp_path.replace(path)
+    # Записанные данные сразу кладутся в кэш с новой версией файла,
+    # чтобы следующая отрисовка не считывала его заново
+    if partition_cache.max_bytes:
+        partition_cache.put(path, df)
+    update_index(path, df)
+
+
+def index_path(folder: Path) -> Path:
+    return folder / index_name
+
+
+def describe_partition(path: Path, df: pd.DataFrame | None = None) -> dict:
+    """
+    Функция, возвращающая запись индекса для файла-месяца
+    :param path: путь к файлу-месяцу
+    :param df: содержимое файла, если оно уже считано
+    :return: словарь с именем файла, временем его изменения,
+    границами времени и числом строк
+    """
+    if df is None:
+        df = read_partition(path, columns=[])
+    timestamps = df[time_col].dropna()
+    return {
+        'file': path.name,
+        'mtime_ns': path.stat().st_mtime_ns,
+        'min': timestamps.min().isoformat() if len(timestamps) else None,
+        'max': timestamps.max().isoformat() if len(timestamps) else None,
+        'rows': len(df),
+    }
+
+
+def meta_path(folder: Path) -> Path:
+    return folder / meta_name
+
+
+def dump_json(path: Path, data: dict) -> None:
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    with tmp_path.open('w') as f:
+        json.dump(data, f, indent=2)
+    tmp_path.replace(path)
+
+
+def summarize_index(index: dict[str, dict]) -> dict:
+    """
+    Функция, сводящая индекс файлов-месяцев в сводку по прибору
+    :param index: индекс файлов-месяцев прибора
+    :return: словарь с первым и последним временем и числом строк
+    """
+    entries = [entry for entry in index.values() if entry['rows']]
+    return {
+        'first': min((entry['min'] for entry in entries), default=None),
+        'last': max((entry['max'] for entry in entries), default=None),
+        'rows': sum(entry['rows'] for entry in entries),
+    }
+
+
+def save_index(folder: Path, index: dict) -> None:
+    dump_json(index_path(folder), index)
+    # Сводка ведется только по исходным данным прибора
+    if folder.name.startswith(rollup_prefix):
+        return
+    # Сводка лежит в той же папке, что и файлы-месяцы,
+    # поэтому папка может быть и вне proc_data
+    meta = read_meta_file(folder)
+    meta.update(summarize_index(index))
+    dump_json(meta_path(folder), meta)
+
+
+def read_meta_file(folder: Path) -> dict:
+    try:
+        with meta_path(folder).open('r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_meta(device_name: str) -> dict:
+    """
+    Функция, возвращающая сводку по прибору
+    :param device_name: имя прибора
+    :return: словарь с ключами first, last (ISO-время или None),
+    rows и last_ingest (время последней обработки или None)
+    """
+    folder = device_folder(device_name)
+    meta = read_meta_file(folder)
+    if 'last' not in meta:
+        # Сводки еще нет: она строится по индексу и сохраняется
+        meta.update(summarize_index(load_index(device_name)))
+        if folder.exists():
+            with index_lock:
+                dump_json(meta_path(folder), meta)
+    meta.setdefault('last_ingest', None)
+    return meta
+
+
+def mark_ingested(device_name: str) -> None:
+    """
+    Функция, запоминающая время последней обработки данных прибора
+    :param device_name: имя прибора
+    """
+    folder = device_folder(device_name)
+    if not folder.exists():
+        return
+    with index_lock:
+        meta = read_meta_file(folder)
+        meta['last_ingest'] = datetime.now().isoformat(timespec='seconds')
+        dump_json(meta_path(folder), meta)
+
+
+def load_index(
+    device_name: str,
+    tier: str | None = None,
+) -> dict[str, dict]:
+    """
+    Функция, возвращающая индекс файлов-месяцев прибора.
+    Записи для файлов, которые изменились в обход write_partition
+    (или появились до индекса), пересчитываются и сохраняются
+    :param device_name: имя прибора
+    :param tier: уровень агрегатов (по умолчанию исходные данные)
+    :return: словарь вида {YYYY_MM: запись индекса}
+    """
+    folder = device_folder(device_name, tier)
+    with index_lock:
+        try:
+            with index_path(folder).open('r') as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stored = {}
+        index = {}
+        for year_month, path in list_partitions(device_name, tier).items():
+            entry = stored.get(year_month)
+            if (
+                entry is None
+                or entry['file'] != path.name
+                or entry['mtime_ns'] != path.stat().st_mtime_ns
+            ):
+                entry = describe_partition(path)
+            index[year_month] = entry
+        if index != stored and folder.exists():
+            save_index(folder, index)
+        return index
+
+
+def update_index(path: Path, df: pd.DataFrame) -> None:
+    """
+    Функция, обновляющая запись индекса после записи файла-месяца
+    :param path: путь к файлу-месяцу
+    :param df: записанные данные
+    """
+    with index_lock:
+        try:
+            with index_path(path.parent).open('r') as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        index[path.stem] = describe_partition(path, df)
+        save_index(path.parent, dict(sorted(index.items())))
+
+
+def read_range(
+    device_name: str,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    columns: list[str] | None = None,
+    tier: str | None = None,
+) -> pd.DataFrame:
+    """
+    Функция, считывающая данные прибора за промежуток времени.
+    По индексу открываются только файлы-месяцы,
+    пересекающиеся с промежутком, и строки фильтруются при чтении
+    :param device_name: имя прибора
+    :param start: начало промежутка (по умолчанию без ограничения)
+    :param end: конец промежутка (по умолчанию без ограничения)
+    :param columns: какие столбцы данных считать (по умолчанию все)
+    :param tier: уровень агрегатов (по умолчанию исходные данные)
+    :return: датафрейм, отсортированный по времени
+    (если данных нет - пустой, со столбцами columns)
+    """
+    frames = []
+    for entry in load_index(device_name, tier).values():
+        if (
+            not entry['rows']
+            or start is not None
+            and pd.Timestamp(entry['max']) < start
+            or end is not None
+            and pd.Timestamp(entry['min']) > end
+        ):
+            continue
+        frames.append(
+            read_partition(
+                device_folder(device_name, tier) / entry['file'],
+                columns,
+                start,
+                end,
+            ),
+        )
+    if not frames:
+        # Пустой датафрейм с теми же типами, что у считанных данных,
+        # чтобы его можно было обрабатывать так же
+        return pd.DataFrame(
+            {
+                time_col: pd.Series(dtype='datetime64[ns]'),
+                **{col: pd.Series(dtype='float32') for col in columns or []},
+            },
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def upsert_partition(
+    path: str | Path,
+    df: pd.DataFrame,
+    columns: list[str],
+) -> None:
+    """
+    Функция, добавляющая строки в файл-месяц.
+    Строки сливаются с файлом по времени: значения из новых строк
+    имеют приоритет, а их пропуски заполняются значениями из файла.
+    Старый CSV-файл этого месяца переводится в Parquet и удаляется
+    :param path: путь к файлу-месяцу
+    :param df: новые строки этого месяца
+    :param columns: столбцы файла, первый из них - временной
+    """
+    path = Path(path)
+    legacy_path = path.with_suffix(legacy_suffix)
+    stored_path = path if path.exists() else legacy_path
+    result = df.drop_duplicates(subset=[time_col]).set_index(time_col)
+    if stored_path.exists():
+        stored = read_partition(stored_path)
+        stored = stored.drop_duplicates(subset=[time_col]).set_index(time_col)
+        # Пропуски при слиянии переводят целые столбцы в float64,
+        # поэтому столбцы возвращаются к общему типу обеих частей
+        dtypes = {
+            col: np.result_type(
+                *(i[col].dtype for i in (result, stored) if col in i),
+            )
+            for col in result.columns.union(stored.columns)
+        }
+        result = result.combine_first(stored)
+        for col, dtype in dtypes.items():
+            if dtype.kind == 'f' or result[col].notna().all():
+                result[col] = result[col].astype(dtype)
+    missing = [col for col in columns[1:] if col not in result.columns]
+    result = (
+        result.sort_index()
+        .reindex(columns=columns[1:])
+        .astype(dict.fromkeys(missing, 'float32'))
+    )
+    write_partition(path, result.reset_index())
+    if legacy_path.exists():
+        legacy_path.unlink()
+
+
+def migrate_device(device_name: str) -> int:
+    """
+    Функция, переводящая все CSV-файлы-месяцы прибора в Parquet
+    :param device_name: имя прибора
+    :return: сколько файлов переведено
+    """
+    migrated = 0
+    for path in list_partitions(device_name).values():
+        if path.suffix != legacy_suffix:
+            continue
+        write_partition(
+            path.with_suffix(partition_suffix),
+            read_partition(path),
+        )
+        path.unlink()
+        migrated += 1
+    return migrated
+
+
+def export_csv(df: pd.DataFrame, buffer) -> None:
+    """
+    Функция, выгружающая данные в CSV для скачивания пользователем
+    :param df: датафрейм с временным столбцом timestamp
+    :param buffer: куда записать CSV
+    """
+    df.to_csv(buffer, index=False)
@@ -0,0 +1,241 @@
+from datetime import datetime
+import hashlib
+import json
+from pathlib import Path
+from threading import Lock
+
+from msu_aerosol.config import (
+    poll_backoff,
+    poll_max_interval,
+    poll_min_interval,
+    sync_state_file,
+)
+
+__all__ = []
+
+# Сколько байт перед смещением хешируется для проверки,
+# что уже обработанное начало файла не изменилось
+prefix_size = 4096
+
+
+def file_md5(path: str | Path, start: int = 0, end: int | None = None) -> str:
+    """
+    Функция, считающая md5 файла или его части
+    :param path: путь к файлу
+    :param start: с какого байта считать
+    :param end: до какого байта считать (по умолчанию до конца файла)
+    """
+    md5 = hashlib.md5(usedforsecurity=False)
+    with Path(path).open('rb') as f:
+        f.seek(start)
+        left = None if end is None else end - start
+        while left is None or left > 0:
+            chunk = f.read(1 << 20 if left is None else min(1 << 20, left))
+            if not chunk:
+                break
+            md5.update(chunk)
+            if left is not None:
+                left -= len(chunk)
+    return md5.hexdigest()
+
+
+def prefix_md5(path: str | Path, offset: int) -> str:
+    return file_md5(path, max(offset - prefix_size, 0), offset)
+
+
+def describe_item(item: dict) -> dict:
+    """
+    Функция, возвращающая атрибуты файла из Я.Диска,
+    по которым определяется, изменился ли он
+    :param item: объект файла из списка файлов прибора
+    :return: словарь с именем, датой изменения, размером и md5 файла
+    """
+    modified = item['modified']
+    return {
+        'name': item['name'],
+        'modified': (
+            modified.isoformat()
+            if hasattr(modified, 'isoformat')
+            else str(modified)
+        ),
+        'size': item['size'],
+        'md5': item['md5'],
+    }
+
+
+class SyncStateHandler:
+    """
+    Обработчик файла с состоянием синхронизации приборов.
+    Для каждого прибора хранится последний обработанный файл.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.lock = Lock()
+
+    def load_state(self) -> dict:
+        """
+        Загрузка файла.
+
+        :return: Словарь вида {имя прибора: состояние}
+        """
+        try:
+            with Path(self.filename).open('r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_state(self, state: dict) -> None:
+        # Запись во временный файл и замена,
+        # чтобы при сбое не остался наполовину записанный файл
+        tmp_path = Path(f'{self.filename}.tmp')
+        with tmp_path.open('w') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(self.filename)
+
+    def get(self, full_name: str) -> dict:
+        return self.load_state().get(full_name, {})
+
+    def is_unchanged(self, full_name: str, item: dict, file_path: str) -> bool:
+        """
+        Проверка, был ли файл уже обработан в текущем виде.
+
+        :param full_name: Имя прибора
+        :param item: Объект файла из Я.Диска
+        :param file_path: Локальный путь к файлу
+        :return: Да/нет
+        """
+        saved = self.get(full_name).get('file')
+        return (
+            saved is not None
+            and Path(file_path).exists()
+            and saved == describe_item(item)
+        )
+
+    def get_offset(self, full_name: str, item: dict, file_path: str) -> int:
+        """
+        Смещение, с которого нужно дочитать файл прибора.
+        Если файл другой или его уже обработанное начало изменилось,
+        файл обрабатывается целиком.
+
+        :param full_name: Имя прибора
+        :param item: Объект файла из Я.Диска
+        :param file_path: Локальный путь к файлу
+        :return: Смещение в байтах
+        """
+        ingest = self.get(full_name).get('ingest')
+        if not ingest or ingest['name'] != item['name']:
+            return 0
+        offset = ingest['offset']
+        path = Path(file_path)
+        if (
+            not path.exists()
+            or path.stat().st_size < offset
+            or prefix_md5(path, offset) != ingest['prefix_md5']
+        ):
+            return 0
+        return offset
+
+    def update(
+        self,
+        full_name: str,
+        item: dict,
+        file_path: str | None = None,
+        offset: int = 0,
+    ) -> None:
+        """
+        Сохранение обработанного файла прибора.
+
+        :param full_name: Имя прибора
+        :param item: Объект файла из Я.Диска
+        :param file_path: Локальный путь к файлу
+        :param offset: До какого байта файл обработан
+        """
+        with self.lock:
+            state = self.load_state()
+            device_state = state.setdefault(full_name, {})
+            file = describe_item(item)
+            previous = device_state.get('file')
+            if previous and previous['modified'] != file['modified']:
+                # Как часто прибор обновляет данные
+                # (экспоненциальное скользящее среднее)
+                delta = (
+                    datetime.fromisoformat(file['modified'])
+                    - datetime.fromisoformat(previous['modified'])
+                ).total_seconds()
+                if delta > 0:
+                    poll = device_state.setdefault('poll', {})
+                    cadence = poll.get('cadence')
+                    poll['cadence'] = (
+                        delta
+                        if cadence is None
+                        else 0.7 * cadence + 0.3 * delta
+                    )
+            device_state['file'] = file
+            if file_path is not None and offset:
+                device_state['ingest'] = {
+                    'name': item['name'],
+                    'offset': offset,
+                    'prefix_md5': prefix_md5(file_path, offset),
+                }
+            else:
+                device_state.pop('ingest', None)
+            self.save_state(state)
+
+    def get_interval(self, full_name: str) -> int:
+        """
+        Текущий интервал опроса прибора в секундах.
+
+        :param full_name: Имя прибора
+        """
+        return (
+            self.get(full_name)
+            .get('poll', {})
+            .get(
+                'interval',
+                2 * poll_min_interval,
+            )
+        )
+
+    def next_interval(
+        self,
+        full_name: str,
+        changed: bool,
+        archived: bool = False,
+    ) -> int:
+        """
+        Интервал до следующего опроса прибора.
+        Если данные обновились, прибор опрашивается вдвое чаще,
+        чем он обычно обновляет данные. Если нет - интервал
+        увеличивается в poll_backoff раз. Архивные приборы
+        опрашиваются реже всего.
+
+        :param full_name: Имя прибора
+        :param changed: Изменился ли последний файл прибора
+        :param archived: В архиве ли прибор
+        :return: Интервал в секундах
+        """
+        with self.lock:
+            state = self.load_state()
+            poll = state.setdefault(full_name, {}).setdefault('poll', {})
+            interval = poll.get('interval', 2 * poll_min_interval)
+            if archived:
+                interval = poll_max_interval
+            elif changed:
+                interval = poll.get('cadence', interval * 2) / 2
+            else:
+                interval *= poll_backoff
+            poll['interval'] = int(
+                min(max(interval, poll_min_interval), poll_max_interval),
+            )
+            self.save_state(state)
+            return poll['interval']
+
+    def remove(self, full_name: str) -> None:
+        with self.lock:
+            state = self.load_state()
+            if state.pop(full_name, None) is not None:
+                self.save_state(state)
+
+
+sync_state = SyncStateHandler(sync_state_file)
@@ -0,0 +1,22 @@
+function watchJob(url) {
+  fetch(url)
+    .then(function (response) {
+      return response.json();
+    })
+    .then(function (job) {
+      var status = document.getElementById('job_status');
+      document.getElementById('job_message').textContent = job.message;
+      document.getElementById('job_progress').style.width = Math.round(job.progress * 100) + '%';
+      if (job.status === 'done') {
+        // Графики перерисованы, страница открывается заново
+        window.location.assign(window.location.pathname);
+      } else if (job.status === 'failed') {
+        status.className = 'alert alert-danger message';
+      } else {
+        setTimeout(watchJob, 2000, url);
+      }
+    })
+    .catch(function () {
+      setTimeout(watchJob, 5000, url);
+    });
+}
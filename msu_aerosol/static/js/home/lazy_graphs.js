@@ -0,0 +1,61 @@
+function loadGraph(placeholder) {
+  if (placeholder.dataset.loaded) {
+    return;
+  }
+  placeholder.dataset.loaded = 'true';
+  fetch(placeholder.dataset.url)
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      placeholder.classList.remove('graph_sparkline');
+      placeholder.innerHTML = html;
+      // Скрипты, вставленные через innerHTML, не выполняются,
+      // поэтому они создаются заново
+      placeholder.querySelectorAll('script').forEach(function (oldScript) {
+        var script = document.createElement('script');
+        script.text = oldScript.text;
+        oldScript.replaceWith(script);
+      });
+    })
+    .catch(function () {
+      placeholder.textContent = 'Не удалось загрузить график';
+    });
+}
+
+function initLazyGraphs(prefetch) {
+  var placeholders = Array.from(document.getElementsByClassName('graph_placeholder'));
+  // На месте графика уже есть миниатюра: интерактивный график
+  // загружается только по щелчку
+  placeholders.forEach(function (placeholder) {
+    if (placeholder.classList.contains('graph_sparkline')) {
+      placeholder.addEventListener('click', function () {
+        loadGraph(placeholder);
+      }, {once: true});
+    }
+  });
+  placeholders = placeholders.filter(function (placeholder) {
+    return !placeholder.classList.contains('graph_sparkline');
+  });
+  // Первые графики загружаются сразу, остальные - когда до них докрутят
+  placeholders.slice(0, prefetch).forEach(loadGraph);
+  var rest = placeholders.slice(prefetch);
+  if (!('IntersectionObserver' in window)) {
+    rest.forEach(loadGraph);
+    return;
+  }
+  var observer = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+      if (entry.isIntersecting) {
+        observer.unobserve(entry.target);
+        loadGraph(entry.target);
+      }
+    });
+  }, {rootMargin: '300px'});
+  rest.forEach(function (placeholder) {
+    observer.observe(placeholder);
+  });
+}
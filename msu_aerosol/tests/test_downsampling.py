@@ -0,0 +1,101 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from parameterized import parameterized
+
+from msu_aerosol import downsampling
+
+__all__: list = []
+
+
+class TestDownsampling(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = np.arange(10000, dtype=np.float64)
+        self.y = np.cumsum(rng.normal(0, 1, 10000))
+        self.y[1234] = 1000.0
+
+    @parameterized.expand(['lttb', 'minmax', 'mean'])
+    def test_point_budget(self, method):
+        x, y = downsampling.methods[method](self.x, self.y, 500)
+        self.assertLessEqual(len(x), 500)
+        self.assertGreater(len(x), 450)
+        self.assertTrue((np.diff(x) > 0).all())
+
+    @parameterized.expand(['lttb', 'minmax'])
+    def test_peak_kept(self, method):
+        _, y = downsampling.methods[method](self.x, self.y, 100)
+        self.assertIn(1000.0, y)
+
+    def test_lttb_keeps_ends(self):
+        x, _ = downsampling.lttb(self.x, self.y, 100)
+        self.assertEqual((x[0], x[-1]), (0, 9999))
+
+    def test_short_series_unchanged(self):
+        x, y = downsampling.lttb(self.x[:10], self.y[:10], 100)
+        np.testing.assert_array_equal(y, self.y[:10])
+
+    def test_gaps_kept(self):
+        y = self.y.copy()
+        y[3000:3100] = np.nan
+        y[7000:] = np.nan
+        x, new_y = downsampling.downsample_series(self.x, y, 200)
+        self.assertEqual(x[np.isnan(new_y)].tolist(), [3000.0, 7000.0])
+        self.assertLessEqual(len(x), 200)
+
+    @parameterized.expand(
+        [
+            (f'{method}_{name}', method, step)
+            for method in downsampling.methods
+            for name, step in (('scattered', None), ('every_7th', 7))
+        ],
+    )
+    def test_budget_with_missing_values(self, _, method, step):
+        rng = np.random.default_rng(1)
+        x = np.arange(172800, dtype=np.float64) * 60
+        y = np.cumsum(rng.normal(0, 1, len(x)))
+        if step:
+            y[::step] = np.nan
+        else:
+            y[rng.choice(len(x), len(x) // 100, replace=False)] = np.nan
+        # Настоящий пропуск длиной в сутки остается на графике
+        y[50000:51440] = np.nan
+        new_x, new_y = downsampling.downsample_series(x, y, 2000, method)
+        self.assertLessEqual(len(new_x), 2000)
+        self.assertGreater(len(new_x), 900)
+        self.assertIn(50000 * 60, new_x[np.isnan(new_y)])
+        self.assertTrue((np.diff(new_x) >= 0).all())
+
+    def test_frame(self):
+        df = pd.DataFrame(
+            {
+                'timestamp': pd.date_range(
+                    '2024-01-01',
+                    periods=10000,
+                    freq='s',
+                ),
+                'BC1': self.y.astype(np.float32),
+                'BC2': np.nan,
+            },
+        )
+        result = downsampling.downsample_frame(
+            df,
+            'timestamp',
+            ['BC1', 'BC2'],
+            100,
+        )
+        self.assertEqual(result['variable'].unique().tolist(), ['BC1'])
+        self.assertEqual(len(result), 100)
+        self.assertEqual(result['value'].dtype, np.float32)
+        self.assertEqual(result['timestamp'].iloc[0], df['timestamp'].iloc[0])
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            downsampling.downsample_frame(
+                pd.DataFrame({'timestamp': []}),
+                'timestamp',
+                [],
+                10,
+                'median',
+            )
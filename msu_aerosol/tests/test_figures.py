@@ -0,0 +1,99 @@
+import base64
+import json
+import re
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from msu_aerosol.figures import encode_array, figure_html
+
+__all__: list = []
+
+
+class TestFigureHtml(unittest.TestCase):
+    def setUp(self):
+        self.time = pd.date_range('2024-01-01', periods=3, freq='min')
+        self.layout = {'xaxis': {'title': {'text': 'Time'}}}
+
+    def trace(self, name: str, time: pd.DatetimeIndex) -> dict:
+        return {
+            'name': name,
+            'type': 'scattergl',
+            'x': time.to_numpy(),
+            'y': np.array([1, np.nan, 3], dtype='float32'),
+        }
+
+    def parse(self, html: str) -> tuple[list, list, dict]:
+        def value(name: str) -> object:
+            match = re.search(rf'var {name} = (.*?);', html)
+            return json.loads(match.group(1).split('.map(')[0])
+
+        layout = re.search(r'Plotly\.newPlot\("[^"]+", data, (.*?), \{', html)
+        return value('time'), value('data'), json.loads(layout.group(1))
+
+    def test_time_shared(self):
+        html = figure_html(
+            [self.trace('BC1', self.time), self.trace('BC2', self.time)],
+            self.layout,
+            'typed',
+        )
+        time, data, layout = self.parse(html)
+        self.assertEqual(len(time), 1)
+        self.assertEqual([trace['x'] for trace in data], [0, 0])
+        self.assertEqual(time[0]['dtype'], 'u4')
+        self.assertEqual(
+            time[0]['start'],
+            self.time[0].value // 1_000_000,
+        )
+        steps = np.frombuffer(base64.b64decode(time[0]['bdata']), dtype='u4')
+        self.assertEqual(steps.tolist(), [0, 60_000, 60_000])
+        self.assertEqual(data[0]['y']['dtype'], 'f4')
+        self.assertEqual(layout['xaxis']['type'], 'date')
+        self.assertEqual(layout['xaxis']['title'], {'text': 'Time'})
+
+    def test_different_time(self):
+        html = figure_html(
+            [
+                self.trace('BC1', self.time),
+                self.trace('BC2', self.time + pd.Timedelta(seconds=1)),
+            ],
+            self.layout,
+            'typed',
+        )
+        time, data, _ = self.parse(html)
+        self.assertEqual(len(time), 2)
+        self.assertEqual([trace['x'] for trace in data], [0, 1])
+
+    def test_long_step(self):
+        time = self.time.insert(3, pd.Timestamp('2024-03-01'))
+        trace = dict(self.trace('BC1', time), y=np.arange(4.0))
+        time_axes, _, _ = self.parse(
+            figure_html([trace], self.layout, 'typed'),
+        )
+        milliseconds = np.frombuffer(
+            base64.b64decode(time_axes[0]['bdata']),
+            dtype='f8',
+        )
+        self.assertEqual(time_axes[0]['dtype'], 'f8')
+        self.assertEqual(milliseconds[-1], time[-1].value / 1e6)
+
+    def test_json(self):
+        html = figure_html([self.trace('BC1', self.time)], self.layout, 'json')
+        self.assertIn('2024-01-01T00:01:00', html)
+        self.assertNotIn('bdata', html)
+
+    def test_json_float32(self):
+        values = np.array([1.2, 3.4, np.nan, 861.233], dtype='float32')
+        self.assertEqual(
+            json.dumps(encode_array(values, 'json')),
+            '[1.2, 3.4, null, 861.233]',
+        )
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            figure_html([], self.layout, 'xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import gzip
+from http import HTTPStatus
+import os
+from pathlib import Path
+import tempfile
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+from app import app
+from msu_aerosol import fragments
+from views import graph as graph_views
+
+__all__: list = []
+
+
+class TestFragments(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        for name, folder in (
+            ('graphs_path', 'graphs'),
+            ('legacy_graphs_path', 'templates/includes/graphs'),
+        ):
+            patcher = mock.patch.object(
+                fragments,
+                name,
+                str(Path(self.tmp_dir.name, folder)),
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = fragments.FragmentCache()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_missing_fragment(self):
+        self.assertEqual(self.cache.get('AE33', 'full'), '')
+
+    def test_rewritten_fragment_reread(self):
+        path = fragments.write_fragment('AE33', 'full', '<div>1</div>')
+        self.assertEqual(self.cache.get('AE33', 'full'), '<div>1</div>')
+        fragments.write_fragment('AE33', 'full', '<div>22</div>')
+        self.assertEqual(self.cache.get('AE33', 'full'), '<div>22</div>')
+        self.assertEqual(
+            sorted(path.parent.iterdir()),
+            sorted(
+                [path]
+                + [
+                    fragments.compressed_path(path, encoding)
+                    for encoding in fragments.compressors
+                ],
+            ),
+        )
+
+    def test_unchanged_fragment_not_reread(self):
+        fragments.write_fragment('AE33', 'recent', '<div></div>')
+        self.cache.get('AE33', 'recent')
+        with mock.patch.object(Path, 'read_text') as read_text:
+            self.cache.get('AE33', 'recent')
+        read_text.assert_not_called()
+
+    def test_legacy_fragment_moved(self):
+        legacy = Path(
+            fragments.legacy_graphs_path,
+            'recent',
+            'graph_AE33.html',
+        )
+        legacy.parent.mkdir(parents=True)
+        legacy.write_text('<div>old</div>')
+        self.assertEqual(self.cache.get('AE33', 'recent'), '<div>old</div>')
+        self.assertFalse(legacy.exists())
+        self.assertTrue(fragments.fragment_path('AE33', 'recent').exists())
+
+    def test_endpoint_conditional(self):
+        path = fragments.write_fragment('AE33', 'full', '<div>1</div>')
+        os.utime(path, (1_700_000_000, 1_700_000_000))
+        query = mock.Mock()
+        query.get_or_404.return_value = SimpleNamespace(name='AE33')
+        client = app.test_client()
+        with mock.patch.object(
+            graph_views,
+            'Graph',
+            SimpleNamespace(query=query),
+        ):
+            response = client.get('/graphs/1/fragment/full')
+            etag = response.headers['ETag']
+            repeated = client.get(
+                '/graphs/1/fragment/full',
+                headers={'If-None-Match': etag},
+            )
+            missing = client.get('/graphs/1/fragment/recent')
+        # Ответы send_file держат файл открытым, пока их не закроют
+        for i in (response, repeated, missing):
+            self.addCleanup(i.close)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.get_data(as_text=True), '<div>1</div>')
+        self.assertIn('Last-Modified', response.headers)
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        self.assertEqual(repeated.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(missing.status_code, HTTPStatus.NOT_FOUND)
+
+    def get_compressed(self) -> object:
+        query = mock.Mock()
+        query.get_or_404.return_value = SimpleNamespace(name='AE33')
+        with mock.patch.object(
+            graph_views,
+            'Graph',
+            SimpleNamespace(query=query),
+        ):
+            response = app.test_client().get(
+                '/graphs/1/fragment/full',
+                headers={'Accept-Encoding': 'gzip'},
+            )
+        self.addCleanup(response.close)
+        return response
+
+    def test_endpoint_compressed(self):
+        fragments.write_fragment('AE33', 'full', '<div>1</div>')
+        response = self.get_compressed()
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), b'<div>1</div>')
+
+    def test_stale_compressed_not_served(self):
+        path = fragments.write_fragment('AE33', 'full', '<div>1</div>')
+        compressed = fragments.compressed_path(path, 'gzip')
+        os.utime(compressed, (1_700_000_000, 1_700_000_000))
+        response = self.get_compressed()
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, b'<div>1</div>')
+
+    def test_sparkline_not_compressed(self):
+        path = fragments.write_fragment(
+            'AE33',
+            'sparkline',
+            '<svg></svg>',
+            compress=False,
+        )
+        self.assertEqual(path.suffix, '.svg')
+        self.assertEqual(list(path.parent.iterdir()), [path])
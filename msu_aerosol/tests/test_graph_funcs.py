@@ -0,0 +1,290 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from msu_aerosol import graph_funcs, rollups, sources, storage
+from msu_aerosol.exceptions import SourceError
+
+__all__: list = []
+
+
+def make_items(names):
+    return [
+        {'name': name, 'modified': datetime(2024, 1, 1 + i % 28, i % 24)}
+        for i, name in enumerate(names)
+    ]
+
+
+class TestListing(unittest.TestCase):
+    def test_newest_csv_preferred(self):
+        items = make_items(['a.csv', 'b.csv', 'c.txt'])
+        self.assertEqual(graph_funcs.newest_data_file(items)['name'], 'b.csv')
+
+    def test_newest_txt_without_csv(self):
+        items = make_items(['a.txt', 'b.txt', 'readme.md'])
+        self.assertEqual(graph_funcs.newest_data_file(items)['name'], 'b.txt')
+
+    def test_no_data_files(self):
+        self.assertIsNone(
+            graph_funcs.newest_data_file(make_items(['readme.md'])),
+        )
+
+
+class TestDownload(unittest.TestCase):
+    # Один цикл скачиваний на все тесты, как в приложении
+    transfer = sources.AsyncTransfer(2)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        (self.root / 'source' / 'AE33').mkdir(parents=True)
+        for i in range(6):
+            (self.root / 'source' / 'AE33' / f'2024_0{i + 1}.csv').write_text(
+                f'timestamp;BC\n{i};{i}\n',
+            )
+        self.source = sources.LocalDirectorySource(str(self.root / 'source'))
+        for name, value in (
+            ('main_path', str(self.root / 'data')),
+            ('source', self.source),
+            ('transfer', self.transfer),
+            ('download_backoff', 0),
+            ('download_retries', 2),
+        ):
+            patcher = mock.patch.object(graph_funcs, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def download_all(self) -> None:
+        self.transfer.run(graph_funcs.download_device_data('AE33', 'AE33'))
+
+    def test_concurrency_limited(self):
+        active = []
+        peak = []
+        download = self.source.adownload
+
+        async def adownload(item, file_path):
+            active.append(item['name'])
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            await download(item, file_path)
+            active.remove(item['name'])
+
+        with mock.patch.object(self.source, 'adownload', adownload):
+            self.download_all()
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(
+            sorted(i.name for i in (self.root / 'data' / 'AE33').iterdir()),
+            [f'2024_0{i}.csv' for i in range(1, 7)],
+        )
+
+    def download_one(self, failures: list[Exception]) -> None:
+        """
+        Скачивание одного файла: первые попытки пишут часть файла
+        и завершаются ошибками из failures. Пути, по которым
+        скачивался файл, остаются в self.attempts
+        """
+        item = next(self.source.iter_items('AE33'))
+        attempts = self.attempts = []
+        download = self.source.adownload
+
+        async def adownload(item, file_path):
+            attempts.append(file_path)
+            if len(attempts) <= len(failures):
+                Path(file_path).write_text('timestamp;BC\n')
+                raise failures[len(attempts) - 1]
+            await download(item, file_path)
+
+        (self.root / 'data' / 'AE33').mkdir(parents=True)
+        with mock.patch.object(self.source, 'adownload', adownload):
+            self.transfer.run(graph_funcs.download_file('AE33', item))
+
+    def data_files(self) -> list[str]:
+        return sorted(i.name for i in (self.root / 'data' / 'AE33').iterdir())
+
+    def test_retried(self):
+        self.download_one([SourceError('1'), SourceError('2')])
+        self.assertEqual(len(self.attempts), 3)
+        self.assertTrue(self.attempts[0].endswith('2024_01.csv.part'))
+        self.assertEqual(self.data_files(), ['2024_01.csv'])
+        self.assertEqual(
+            (self.root / 'data' / 'AE33' / '2024_01.csv').read_text(),
+            'timestamp;BC\n0;0\n',
+        )
+
+    def test_final_failure(self):
+        with (
+            mock.patch.object(graph_funcs, 'download_backoff', 1),
+            mock.patch.object(graph_funcs.asyncio, 'sleep') as sleep,
+            self.assertRaises(SourceError),
+        ):
+            self.download_one([SourceError(str(i)) for i in range(3)])
+        # Задержка между попытками растет экспоненциально
+        self.assertEqual([i.args[0] for i in sleep.call_args_list], [1, 2])
+        self.assertEqual(len(self.attempts), 3)
+        self.assertEqual(self.data_files(), [])
+
+    def test_other_error_not_retried(self):
+        with self.assertRaises(OSError):
+            self.download_one([OSError('disk full')])
+        self.assertEqual(len(self.attempts), 1)
+        self.assertEqual(self.data_files(), [])
+
+
+class TestProcSpaces(unittest.TestCase):
+    def setUp(self):
+        timestamp = pd.to_datetime(
+            [
+                '2024-01-01 00:00:00',
+                '2024-01-01 00:01:00',
+                '2024-01-01 00:02:00',
+                '2024-01-01 03:00:00',
+                '2024-01-01 03:01:00',
+            ],
+        )
+        self.df = pd.DataFrame(
+            {
+                'timestamp': timestamp[::-1],
+                'BC1': [5.0, 4.0, 3.0, 2.0, 1.0],
+            },
+        )
+
+    def test_gap_rows_added(self):
+        result = graph_funcs.proc_spaces(self.df, 'timestamp')
+        added = result.iloc[5:]
+        self.assertEqual(len(result), 7)
+        self.assertEqual(
+            added['timestamp'].tolist(),
+            pd.to_datetime(
+                ['2024-01-01 00:02:01', '2024-01-01 02:59:59'],
+            ).tolist(),
+        )
+        self.assertTrue(added['BC1'].isna().all())
+
+    def test_dtypes_kept(self):
+        result = graph_funcs.proc_spaces(self.df, 'timestamp')
+        self.assertEqual(result['BC1'].dtype, float)
+        self.assertTrue(
+            pd.api.types.is_datetime64_any_dtype(result['timestamp']),
+        )
+
+    def test_duplicated_columns_dropped(self):
+        df = pd.concat([self.df, self.df[['BC1']]], axis=1)
+        result = graph_funcs.proc_spaces(df, 'timestamp')
+        self.assertEqual(result.columns.tolist(), ['timestamp', 'BC1'])
+
+    def test_single_row(self):
+        result = graph_funcs.proc_spaces(self.df.iloc[:1], 'timestamp')
+        self.assertEqual(len(result), 1)
+
+
+class TestReadViews(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(
+            storage,
+            'proc_data_path',
+            self.tmp_dir.name,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(storage.partition_cache.clear)
+        periods = 20 * 1440
+        df = pd.DataFrame(
+            {
+                'timestamp': pd.date_range(
+                    '2024-01-01',
+                    periods=periods,
+                    freq='60s',
+                ),
+                'BC1': np.sin(np.arange(periods) / 100).astype('float32'),
+            },
+        )
+        storage.upsert_partition(
+            storage.partition_path('AE33', 2024, 1),
+            df,
+            list(df.columns),
+        )
+        rollups.update_rollups(
+            'AE33',
+            df['timestamp'].min(),
+            df['timestamp'].max(),
+        )
+        self.end = df['timestamp'].max()
+        self.starts = {
+            'full': self.end - pd.Timedelta(days=14),
+            'recent': self.end - pd.Timedelta(days=2),
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_one_read_matches_separate_reads(self):
+        with mock.patch.object(
+            graph_funcs,
+            'read_range',
+            wraps=graph_funcs.read_range,
+        ) as read_range:
+            frames = graph_funcs.read_views(
+                'AE33',
+                self.starts,
+                self.end,
+                2000,
+            )
+        self.assertEqual(read_range.call_count, 1)
+        for view, start in self.starts.items():
+            tier = rollups.choose_tier(start, self.end, 2000)
+            expected = storage.read_range(
+                'AE33',
+                start=start,
+                end=self.end,
+                tier=tier,
+            )
+            expected = graph_funcs.proc_spaces(
+                expected[['timestamp', 'BC1']],
+                'timestamp',
+            )
+            pd.testing.assert_frame_equal(
+                frames[view].reset_index(drop=True),
+                expected,
+            )
+
+    def test_tier_built_later(self):
+        # Данные декабря обработаны до появления агрегатов
+        periods = 12 * 1440
+        storage.upsert_partition(
+            storage.partition_path('AE33', 2023, 12),
+            pd.DataFrame(
+                {
+                    'timestamp': pd.date_range(
+                        '2023-12-20',
+                        periods=periods,
+                        freq='60s',
+                    ),
+                    'BC1': np.ones(periods, dtype='float32'),
+                },
+            ),
+            ['timestamp', 'BC1'],
+        )
+        starts = {'full': pd.Timestamp('2023-12-20')}
+        for tier in (None, '10min'):
+            with mock.patch.object(
+                graph_funcs,
+                'read_range',
+                wraps=graph_funcs.read_range,
+            ) as read_range:
+                frame = graph_funcs.read_views('AE33', starts, self.end, 2000)
+            self.assertEqual(read_range.call_args.kwargs['tier'], tier)
+            self.assertEqual(
+                frame['full']['timestamp'].min(),
+                pd.Timestamp('2023-12-20'),
+            )
+            rollups.rebuild_rollups('AE33')
@@ -0,0 +1,170 @@
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+import pandas as pd
+
+from msu_aerosol import fragments, graph_funcs, render_cache, storage
+from msu_aerosol.models import (
+    db,
+    Device,
+    Graph,
+    TimeColumn,
+    VariableColumn,
+)
+
+__all__: list = []
+
+
+def make_lines(start: str, periods: int) -> str:
+    timestamps = pd.date_range(start, periods=periods, freq='min')
+    return ''.join(
+        f'{timestamp:%Y-%m-%d %H:%M:%S};{i},5\n'
+        for i, timestamp in enumerate(timestamps)
+    )
+
+
+class TestOffsetIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        for patcher in (
+            mock.patch.object(
+                storage,
+                'proc_data_path',
+                str(self.root / 'proc_data'),
+            ),
+            mock.patch.object(
+                fragments,
+                'graphs_path',
+                str(self.root / 'graphs'),
+            ),
+            mock.patch.object(
+                graph_funcs,
+                'render_cache',
+                render_cache.RenderCache(self.root / 'render_cache.json'),
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(storage.partition_cache.clear)
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = (
+            f'sqlite:///{self.root / "ingest.db"}'
+        )
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        with self.app.app_context():
+            db.create_all()
+            # Записи добавляются в обход событий ORM: при добавлении прибора
+            # админка скачивает его данные из источника
+            for table, values in (
+                (Device, {'name': 'AE33', 'full_name': 'AE33', 'link': 'L'}),
+                (
+                    Graph,
+                    {
+                        'name': 'AE33',
+                        'device_id': 1,
+                        'time_format': 'Y-m-d H:M:S',
+                        'created': True,
+                    },
+                ),
+                (TimeColumn, {'name': 'Time', 'use': True, 'graph_id': 1}),
+                (
+                    VariableColumn,
+                    {
+                        'name': 'BC',
+                        'use': True,
+                        'default': True,
+                        'color': '#ff0000',
+                        'graph_id': 1,
+                    },
+                ),
+            ):
+                db.session.execute(table.__table__.insert().values(**values))
+            db.session.commit()
+        self.path = self.root / 'AE33.csv'
+        self.path.write_text('Time;BC\n' + make_lines('2024-01-01', 10))
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def ingest(self, offset: int) -> int | None:
+        with self.app.app_context():
+            return graph_funcs.preprocessing_one_file(
+                Graph.query.first(),
+                str(self.path),
+                offset=offset,
+                live=True,
+            )
+
+    def append(self, text: str) -> None:
+        with self.path.open('a') as f:
+            f.write(text)
+
+    def test_appended_twice(self):
+        first = self.ingest(0)
+        self.assertEqual(first, self.path.stat().st_size)
+        # После пробела в 3 часа дописывается строка с неполной последней
+        self.append(make_lines('2024-01-01 03:00', 5) + '2024-01-01 03')
+        second = self.ingest(first)
+        self.assertEqual(second, self.path.stat().st_size - 13)
+        self.append(':05:00;5,5\n')
+        third = self.ingest(second)
+        self.assertEqual(third, self.path.stat().st_size)
+
+        df = storage.read_range('AE33')
+        values = df.dropna()
+        self.assertEqual(len(values), 16)
+        self.assertEqual(values['BC'].iloc[-1], 5.5)
+        # На границах пробела, пришедшегося на стык частей файла,
+        # остаются пустые строки, разрывающие график
+        gap = df[df['BC'].isna()]['timestamp'].tolist()
+        self.assertEqual(
+            gap,
+            [
+                pd.Timestamp('2024-01-01 00:09:01'),
+                pd.Timestamp('2024-01-01 02:59:59'),
+            ],
+        )
+
+    def test_closed_file_read_to_end(self):
+        # Файл без перевода строки в конце, который уже не дописывается
+        self.append('2024-01-01 00:10:00;10,5')
+        with self.app.app_context():
+            end = graph_funcs.preprocessing_one_file(
+                Graph.query.first(),
+                str(self.path),
+            )
+        self.assertEqual(end, self.path.stat().st_size)
+        df = storage.read_range('AE33').dropna()
+        self.assertEqual(len(df), 11)
+        self.assertEqual(df['BC'].iloc[-1], 10.5)
+
+    def test_process_device_file(self):
+        # Прибор и графики загружаются в разных контекстах приложения,
+        # как в задаче планировщика
+        offset = graph_funcs.process_device_file(
+            'AE33',
+            str(self.path),
+            app=self.app,
+        )
+        self.assertEqual(offset, self.path.stat().st_size)
+        for view in fragments.views:
+            self.assertIsNotNone(fragments.find_fragment('AE33', view))
+
+    def test_read_tail_stops_at_end(self):
+        size = self.path.stat().st_size
+        self.append('2024-01-01 00:10:00;1')
+        tail = graph_funcs.read_tail(str(self.path), size, size)
+        self.assertTrue(tail.startswith(b'Time;BC\n'))
+        self.assertTrue(tail.endswith(b'00:09:00;9,5\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
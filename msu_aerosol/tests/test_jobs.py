@@ -0,0 +1,97 @@
+from pathlib import Path
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+
+from msu_aerosol import jobs
+from msu_aerosol.models import db, Job
+
+__all__: list = []
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = (
+            f'sqlite:///{Path(self.tmp_dir.name, "jobs.db")}'
+            '?check_same_thread=False'
+        )
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        with self.app.app_context():
+            db.create_all()
+        self.queue = jobs.JobQueue(workers=2, poll_interval=0.05)
+        self.calls = []
+
+        @jobs.job_handler('test')
+        def handler(job, payload, report):
+            self.calls.append(payload)
+            report(0.5, 'Половина')
+            if payload.get('fail'):
+                raise ValueError
+
+        self.addCleanup(jobs.handlers.pop, 'test')
+
+    def tearDown(self):
+        self.queue.stop()
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def wait(self, job_id: int) -> Job:
+        for _ in range(100):
+            with self.app.app_context():
+                job = Job.query.get(job_id)
+                if job.status in ('done', 'failed'):
+                    return job
+            time.sleep(0.05)
+        return self.fail('Задача не выполнена')
+
+    def enqueue(self, **kwargs) -> int:
+        with self.app.app_context():
+            return self.queue.enqueue('test', **kwargs).id
+
+    def test_job_done(self):
+        self.queue.start(self.app)
+        job = self.wait(self.enqueue(device_id=1, value=1))
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.progress, 1)
+        self.assertIsNotNone(job.finished)
+        self.assertEqual(self.calls, [{'value': 1}])
+
+    def test_job_failed(self):
+        self.queue.start(self.app)
+        job = self.wait(self.enqueue(fail=True))
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.progress, 0.5)
+        self.assertEqual(
+            job.message,
+            'Невозможно предобработать данные по выбранным столбцам',
+        )
+
+    def test_unknown_kind(self):
+        with self.app.app_context(), self.assertRaises(ValueError):
+            self.queue.enqueue('unknown')
+
+    def test_one_job_per_device(self):
+        first = self.enqueue(device_id=1)
+        second = self.enqueue(device_id=1)
+        other = self.enqueue(device_id=2)
+        with self.app.app_context():
+            self.assertEqual(self.queue.claim(), first)
+            # Второй задаче того же прибора придется подождать
+            self.assertEqual(self.queue.claim(), other)
+            self.assertIsNone(self.queue.claim())
+            self.queue.run(first)
+            self.assertEqual(self.queue.claim(), second)
+
+    def test_interrupted_job_restarted(self):
+        job_id = self.enqueue()
+        with self.app.app_context():
+            self.queue.claim()
+        self.queue.start(self.app)
+        self.assertEqual(self.wait(job_id).status, 'done')
@@ -0,0 +1,89 @@
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from msu_aerosol import render_cache, storage
+
+__all__: list = []
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(
+            storage,
+            'proc_data_path',
+            self.tmp_dir.name,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(storage.partition_cache.clear)
+        self.path = Path(self.tmp_dir.name, 'graphs', 'render_cache.json')
+        self.cache = render_cache.RenderCache(self.path)
+        self.start = pd.Timestamp('2024-01-01')
+        self.end = pd.Timestamp('2024-01-14')
+        self.settings = ['AE33', [['BC1', True, '#ff0000', 1]]]
+        self.write_month('2024-01-10')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_month(self, start: str) -> None:
+        storage.upsert_partition(
+            storage.partition_path('AE33', 2024, 1),
+            pd.DataFrame(
+                {
+                    'timestamp': pd.date_range(start, periods=3, freq='h'),
+                    'BC1': [1.0, 2.0, 3.0],
+                },
+            ),
+            ['timestamp', 'BC1'],
+        )
+
+    def key(self, settings: list | None = None, start=None) -> str:
+        return render_cache.render_key(
+            'AE33',
+            settings or self.settings,
+            start or self.start,
+            self.end,
+        )
+
+    def test_key_stable(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_key_changes(self):
+        key = self.key()
+        self.assertNotEqual(
+            key,
+            self.key(['AE33', [['BC1', True, '#00ff00', 1]]]),
+        )
+        self.assertNotEqual(key, self.key(start=pd.Timestamp('2024-01-02')))
+        self.write_month('2024-01-12')
+        self.assertNotEqual(key, self.key())
+
+    def test_fresh_after_put(self):
+        key = self.key()
+        with mock.patch.object(render_cache, 'find_fragment') as find:
+            self.assertFalse(self.cache.fresh('AE33', 'full', key))
+            self.cache.put('AE33', 'full', key)
+            self.assertTrue(self.cache.fresh('AE33', 'full', key))
+            self.assertFalse(self.cache.fresh('AE33', 'full', 'other'))
+            # Без отрисованного графика отпечаток не помогает
+            find.return_value = None
+            self.assertFalse(self.cache.fresh('AE33', 'full', key))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+        self.assertEqual(stats['entries'], 1)
+
+    def test_persisted(self):
+        self.cache.put('AE33', 'recent', 'key')
+        with mock.patch.object(render_cache, 'find_fragment'):
+            reloaded = render_cache.RenderCache(self.path)
+            self.assertTrue(reloaded.fresh('AE33', 'recent', 'key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from parameterized import parameterized
+
+from msu_aerosol import rollups, storage
+
+__all__: list = []
+
+
+def make_raw(start: str, periods: int) -> pd.DataFrame:
+    timestamp = pd.date_range(start, periods=periods, freq='10s')
+    return pd.DataFrame(
+        {
+            'timestamp': timestamp,
+            'BC1': np.arange(periods, dtype='float32'),
+            'BC2': np.where(
+                np.arange(periods) % 7 == 0,
+                np.nan,
+                np.arange(periods) * 2.0,
+            ).astype('float32'),
+        },
+    )
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(
+            storage,
+            'proc_data_path',
+            self.tmp_dir.name,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(storage.partition_cache.clear)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def ingest(self, df: pd.DataFrame) -> None:
+        period = df['timestamp'].dt.year * 100 + df['timestamp'].dt.month
+        for key, df_month in df.groupby(period):
+            storage.upsert_partition(
+                storage.partition_path('AE33', key // 100, key % 100),
+                df_month,
+                list(df.columns),
+            )
+        rollups.update_rollups(
+            'AE33',
+            df['timestamp'].min(),
+            df['timestamp'].max(),
+        )
+
+    def expected(self, df: pd.DataFrame, freq: str) -> pd.DataFrame:
+        return df.resample(freq, on='timestamp')[['BC1', 'BC2']].agg(
+            ['mean', 'min', 'max', 'count'],
+        )
+
+    def test_aggregates_match_raw(self):
+        # Двое суток с переходом через границу месяца
+        df = make_raw('2024-01-31 00:00:00', 2 * 8640)
+        self.ingest(df)
+        for tier in rollups.tiers:
+            result = storage.read_range('AE33', tier=tier)
+            expected = self.expected(df, rollups.tiers[tier])
+            for col in ('BC1', 'BC2'):
+                np.testing.assert_allclose(
+                    result[col],
+                    expected[(col, 'mean')],
+                    rtol=1e-6,
+                )
+                for stat in rollups.stats:
+                    np.testing.assert_allclose(
+                        result[rollups.stat_col(col, stat)],
+                        expected[(col, stat)],
+                    )
+
+    def test_reingest_does_not_double_count(self):
+        df = make_raw('2024-01-01 00:00:00', 1000)
+        self.ingest(df.iloc[:600])
+        # Новый файл повторяет часть уже обработанных строк
+        self.ingest(df.iloc[400:])
+        result = storage.read_range('AE33', tier='1h')
+        self.assertEqual(
+            result[rollups.stat_col('BC1', 'count')].sum(),
+            1000,
+        )
+        np.testing.assert_allclose(
+            result['BC1'],
+            self.expected(df, '1h')[('BC1', 'mean')],
+            rtol=1e-6,
+        )
+
+    def test_rebuild_by_month(self):
+        df = make_raw('2024-01-31 00:00:00', 2 * 8640)
+        period = df['timestamp'].dt.month
+        for month, df_month in df.groupby(period):
+            storage.upsert_partition(
+                storage.partition_path('AE33', 2024, month),
+                df_month,
+                list(df.columns),
+            )
+        with mock.patch.object(
+            rollups,
+            'read_range',
+            wraps=rollups.read_range,
+        ) as read_range:
+            rollups.rebuild_rollups('AE33')
+        for call in read_range.call_args_list:
+            if call.kwargs['tier'] is None:
+                self.assertEqual(
+                    call.kwargs['start'].month,
+                    call.kwargs['end'].month,
+                )
+        result = storage.read_range('AE33', tier='1d')
+        self.assertEqual(
+            result[rollups.stat_col('BC1', 'count')].tolist(),
+            [8640, 8640],
+        )
+
+    def test_empty_buckets_skipped(self):
+        df = pd.concat(
+            [
+                make_raw('2024-01-01 00:00:00', 6),
+                make_raw('2024-01-01 05:00:00', 6),
+            ],
+            ignore_index=True,
+        )
+        self.ingest(df)
+        result = storage.read_range('AE33', tier='1h')
+        self.assertEqual(
+            result['timestamp'].tolist(),
+            pd.to_datetime(['2024-01-01 00:00', '2024-01-01 05:00']).tolist(),
+        )
+
+
+class TestChooseTier(unittest.TestCase):
+    @parameterized.expand(
+        [
+            ('hour', pd.Timedelta(hours=1), None),
+            ('two_days', pd.Timedelta(days=2), '1min'),
+            ('two_weeks', pd.Timedelta(days=14), '10min'),
+            ('year', pd.Timedelta(days=365), '1h'),
+            ('ten_years', pd.Timedelta(days=3650), '1d'),
+        ],
+    )
+    def test_choose_tier(self, _, span, tier):
+        start = pd.Timestamp('2024-01-01')
+        self.assertEqual(rollups.choose_tier(start, start + span, 2000), tier)
@@ -0,0 +1,178 @@
+import base64
+from http import HTTPStatus
+import tempfile
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from parameterized import parameterized
+
+from app import app
+from msu_aerosol import rollups, series, storage
+from msu_aerosol.exceptions import SeriesRequestError
+from views import api
+
+__all__: list = []
+
+
+def make_graph():
+    columns = [
+        SimpleNamespace(
+            name='BC1',
+            use=True,
+            default=True,
+            color='#ff0000',
+            coefficient=1,
+        ),
+        SimpleNamespace(
+            name='BC2',
+            use=True,
+            default=False,
+            color='#0000ff',
+            coefficient=2,
+        ),
+        SimpleNamespace(
+            name='BCbb',
+            use=False,
+            default=False,
+            color='#00ff00',
+            coefficient=1,
+        ),
+    ]
+    return SimpleNamespace(
+        id=1,
+        device=SimpleNamespace(name='AE33'),
+        columns=columns,
+    )
+
+
+class TestSeries(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(
+            storage,
+            'proc_data_path',
+            self.tmp_dir.name,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(storage.partition_cache.clear)
+        # Минутные данные за 30 дней
+        periods = 30 * 1440
+        self.df = pd.DataFrame(
+            {
+                'timestamp': pd.date_range(
+                    '2024-01-01',
+                    periods=periods,
+                    freq='60s',
+                ),
+                'BC1': np.arange(periods, dtype='float32'),
+                'BC2': np.ones(periods, dtype='float32'),
+                'BCbb': np.zeros(periods, dtype='float32'),
+            },
+        )
+        storage.upsert_partition(
+            storage.partition_path('AE33', 2024, 1),
+            self.df,
+            list(self.df.columns),
+        )
+        rollups.update_rollups(
+            'AE33',
+            self.df['timestamp'].min(),
+            self.df['timestamp'].max(),
+        )
+        self.graph = make_graph()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_default_range_and_columns(self):
+        payload = series.series_payload(self.graph, max_points=500)
+        self.assertEqual(payload['end'], '2024-01-30T23:59:00')
+        self.assertEqual(payload['start'], '2024-01-16T23:59:00')
+        self.assertEqual(list(payload['columns']), ['BC1', 'BC2'])
+        bc2 = payload['columns']['BC2']
+        self.assertEqual(bc2['name'], 'BC2 * 2')
+        self.assertFalse(bc2['visible'])
+        self.assertEqual(set(bc2['y']), {2.0})
+        self.assertLessEqual(len(payload['columns']['BC1']['x']), 500)
+
+    def test_short_range_served_from_raw_rows(self):
+        payload = series.series_payload(
+            self.graph,
+            start=pd.Timestamp('2024-01-02 00:00'),
+            end=pd.Timestamp('2024-01-02 00:09'),
+            columns=['BC1'],
+        )
+        self.assertEqual(
+            payload['columns']['BC1']['y'],
+            list(range(1440, 1450)),
+        )
+
+    def test_typed_encoding_matches_json(self):
+        kwargs = {
+            'start': pd.Timestamp('2024-01-05'),
+            'end': pd.Timestamp('2024-01-20'),
+            'max_points': 300,
+            'columns': ['BC1'],
+        }
+        plain = series.series_payload(self.graph, **kwargs)['columns']['BC1']
+        typed = series.series_payload(
+            self.graph,
+            encoding='typed',
+            **kwargs,
+        )[
+            'columns'
+        ]['BC1']
+        self.assertEqual(typed['y']['dtype'], 'f4')
+        y = np.frombuffer(base64.b64decode(typed['y']['bdata']), 'f4')
+        x = np.frombuffer(base64.b64decode(typed['x']['bdata']), 'f8')
+        np.testing.assert_array_equal(y, plain['y'])
+        self.assertEqual(
+            pd.to_datetime(x, unit='ms').tolist(),
+            pd.to_datetime(plain['x']).tolist(),
+        )
+
+    @parameterized.expand(
+        [
+            ('raw', '2023-01-01', '2023-01-02'),
+            ('rollups', '2023-01-01', '2023-03-01'),
+        ],
+    )
+    def test_empty_range(self, _, start, end):
+        with mock.patch.object(
+            api,
+            'Graph',
+            SimpleNamespace(
+                query=SimpleNamespace(get_or_404=lambda _: self.graph),
+            ),
+        ):
+            response = app.test_client().get(
+                '/api/graphs/1/series',
+                query_string={'start': start, 'end': end},
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        for column in response.get_json()['columns'].values():
+            self.assertEqual((column['x'], column['y']), ([], []))
+
+    def test_unknown_column(self):
+        with self.assertRaises(SeriesRequestError):
+            series.series_payload(self.graph, columns=['BCbb'])
+
+    def test_parse_max_points(self):
+        self.assertEqual(series.parse_max_points('1'), 3)
+        self.assertEqual(
+            series.parse_max_points('1000000'),
+            series.max_points_limit,
+        )
+        with self.assertRaises(SeriesRequestError):
+            series.parse_max_points('many')
+
+
+class TestSeriesView(unittest.TestCase):
+    def test_missing_graph(self):
+        with app.app_context():
+            response = app.test_client().get('/api/graphs/100000/series')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,108 @@
+from datetime import datetime
+from http import HTTPStatus
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+from msu_aerosol import sources
+from msu_aerosol.exceptions import SourceError
+
+__all__: list = []
+
+
+class FakeDisk:
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+
+    def get_public_meta(self, link, limit, offset=0):
+        self.calls += 1
+        page = self.items[offset:][:limit]
+        return {'embedded': {'items': page}}
+
+
+class TestDataSource(unittest.TestCase):
+    def test_incomplete_source(self):
+        class ListingOnly(sources.DataSource):
+            def iter_items(self, link):
+                return iter([])
+
+        with self.assertRaises(TypeError):
+            ListingOnly()
+
+
+class TestYandexDiskSource(unittest.TestCase):
+    def test_iter_items_paginates(self):
+        disk = FakeDisk(
+            [
+                {'name': f'{i}.csv', 'modified': datetime(2024, 1, 1)}
+                for i in range(25)
+            ],
+        )
+        yandex = sources.YandexDiskSource('FAKE_TOKEN')
+        yandex.disk = disk
+        with mock.patch.object(sources, 'listing_page_size', 10):
+            items = list(yandex.iter_items('link'))
+
+        self.assertEqual(len(items), 25)
+        self.assertEqual(disk.calls, 3)
+
+    def test_download_tail_interrupted(self):
+        def iter_content(chunk_size):
+            yield b'1714564800;1,5\n'
+            raise requests.ConnectionError
+
+        response = mock.MagicMock(status_code=HTTPStatus.PARTIAL_CONTENT)
+        response.__enter__.return_value = response
+        response.iter_content = iter_content
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            copy = Path(tmp_dir, 'copy.csv')
+            copy.write_text('timestamp;BC\n')
+            yandex = sources.YandexDiskSource('FAKE_TOKEN')
+            with mock.patch.object(
+                sources.requests,
+                'get',
+                return_value=response,
+            ):
+                self.assertFalse(
+                    yandex.download_tail({'file': 'url'}, str(copy)),
+                )
+            self.assertFalse(copy.exists())
+
+
+class TestLocalDirectorySource(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        (self.root / 'AE33').mkdir()
+        (self.root / 'AE33' / '2024_05.csv').write_text('timestamp;BC\n')
+        self.local = sources.LocalDirectorySource(str(self.root))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_iter_items(self):
+        items = list(self.local.iter_items('AE33'))
+        self.assertEqual([i['name'] for i in items], ['2024_05.csv'])
+        self.assertEqual(items[0]['size'], 13)
+
+    def test_missing_folder(self):
+        with self.assertRaises(SourceError):
+            list(self.local.iter_items('missing'))
+
+    def test_download_tail(self):
+        item = next(self.local.iter_items('AE33'))
+        copy = self.root / 'copy.csv'
+        self.local.download(item, str(copy))
+        with (self.root / 'AE33' / '2024_05.csv').open('a') as f:
+            f.write('1714564800;1,5\n')
+        self.assertTrue(self.local.download_tail(item, str(copy)))
+        self.assertEqual(copy.read_text(), 'timestamp;BC\n1714564800;1,5\n')
+
+    def test_failures(self):
+        failing = sources.LocalDirectorySource(str(self.root), failure_rate=1)
+        with self.assertRaises(SourceError):
+            list(failing.iter_items('AE33'))
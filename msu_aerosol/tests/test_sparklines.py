@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from msu_aerosol.sparklines import sparkline_path, sparkline_svg
+
+__all__: list = []
+
+
+class TestSparklines(unittest.TestCase):
+    def setUp(self):
+        time = pd.date_range('2024-01-01', periods=4, freq='h')
+        self.start = time[0]
+        self.end = time[-1]
+        self.plot_data = pd.DataFrame(
+            {
+                'timestamp': list(time) * 2,
+                'variable': ['BC1'] * 4 + ['BC2'] * 4,
+                'value': [1, 2, np.nan, 4, 5, 6, 7, 8],
+            },
+        )
+        self.columns = [
+            SimpleNamespace(name='BC1', color='#ff0000', default=True),
+            SimpleNamespace(name='BC2', color='#0000ff', default=False),
+        ]
+
+    def test_gap_breaks_line(self):
+        path = sparkline_path(
+            np.array([0, 1, 2, 3]),
+            np.array([1, 2, np.nan, 4]),
+        )
+        self.assertEqual(path, 'M0.0,1.0L1.0,2.0M3.0,4.0')
+
+    def test_only_default_columns(self):
+        svg = sparkline_svg(
+            self.plot_data,
+            'timestamp',
+            self.columns,
+            self.start,
+            self.end,
+        )
+        self.assertTrue(svg.startswith('<svg'))
+        self.assertIn('stroke="#ff0000"', svg)
+        self.assertNotIn('#0000ff', svg)
+        self.assertEqual(svg.count('<path'), 1)
+        # Наибольшее значение берется только по видимым столбцам
+        self.assertIn('>4</text>', svg)
+
+    def test_empty_data(self):
+        svg = sparkline_svg(
+            self.plot_data.iloc[:0],
+            'timestamp',
+            self.columns,
+            self.start,
+            self.end,
+        )
+        self.assertIn('d=""', svg)
+
+
+if __name__ == '__main__':
+    unittest.main()
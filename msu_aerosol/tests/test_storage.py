@@ -0,0 +1,279 @@
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from msu_aerosol import storage
+
+__all__: list = []
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(
+            storage,
+            'proc_data_path',
+            self.tmp_dir.name,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = storage.partition_path('AE33', 2024, 1)
+        self.legacy_path = self.path.with_suffix('.csv')
+        self.legacy_path.parent.mkdir(parents=True)
+        # Старый CSV-файл с десятичными запятыми в данных
+        pd.DataFrame(
+            {
+                'timestamp': ['2024-01-01 00:00:00', '2024-01-01 00:02:00'],
+                'BC1': ['1,0', '3,0'],
+                'BC2': [10.0, 30.0],
+            },
+        ).to_csv(self.legacy_path, index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_legacy_csv(self):
+        df = storage.read_range('AE33')
+        self.assertEqual(df['BC1'].tolist(), [1.0, 3.0])
+        self.assertTrue(
+            pd.api.types.is_datetime64_any_dtype(df['timestamp']),
+        )
+
+    def test_index_of_legacy_csv(self):
+        entry = storage.load_index('AE33')['2024_01']
+        self.assertEqual(entry['file'], '2024_01.csv')
+        self.assertEqual(entry['rows'], 2)
+        self.assertEqual(entry['max'], '2024-01-01T00:02:00')
+
+    def test_read_range_opens_only_needed_months(self):
+        for month in (2, 3):
+            storage.write_partition(
+                storage.partition_path('AE33', 2024, month),
+                pd.DataFrame(
+                    {
+                        'timestamp': pd.date_range(
+                            f'2024-{month:02d}-01',
+                            periods=3,
+                            freq='D',
+                        ),
+                        'BC1': [1.0, 2.0, 3.0],
+                    },
+                ),
+            )
+        # Старый CSV-файл индексируется один раз при первом обращении
+        storage.load_index('AE33')
+        with mock.patch.object(
+            storage,
+            'read_partition',
+            wraps=storage.read_partition,
+        ) as read_partition:
+            df = storage.read_range(
+                'AE33',
+                start=pd.Timestamp('2024-02-02'),
+                end=pd.Timestamp('2024-02-03'),
+            )
+        self.assertEqual(read_partition.call_count, 1)
+        self.assertEqual(df['BC1'].tolist(), [2.0, 3.0])
+
+    def test_empty_range(self):
+        df = storage.read_range(
+            'AE33',
+            start=pd.Timestamp('2025-01-01'),
+            columns=['BC1'],
+        )
+        self.assertTrue(df.empty)
+        self.assertTrue(
+            pd.api.types.is_datetime64_any_dtype(df['timestamp']),
+        )
+        self.assertEqual(df['BC1'].dtype, 'float32')
+
+    def test_upsert_migrates_legacy_csv(self):
+        new = pd.DataFrame(
+            {
+                'timestamp': pd.to_datetime(
+                    ['2024-01-01 00:02', '2024-01-01 00:01'],
+                ),
+                'BC1': [4.0, 2.0],
+                'BC2': [None, 20.0],
+            },
+        )
+        storage.upsert_partition(
+            self.path,
+            new,
+            ['timestamp', 'BC1', 'BC2', 'BCbb'],
+        )
+        self.assertFalse(self.legacy_path.exists())
+        self.assertEqual(
+            storage.load_index('AE33')['2024_01']['file'],
+            '2024_01.parquet',
+        )
+        result = storage.read_partition(self.path)
+        self.assertEqual(
+            result.columns.tolist(),
+            ['timestamp', 'BC1', 'BC2', 'BCbb'],
+        )
+        self.assertEqual(result['BC1'].tolist(), [1.0, 2.0, 4.0])
+        self.assertEqual(result['BC2'].tolist(), [10.0, 20.0, 30.0])
+        self.assertTrue(result['BCbb'].isna().all())
+
+    def test_upsert_keeps_dtypes(self):
+        path = storage.partition_path('AE33', 2024, 2)
+        columns = ['timestamp', 'BC1', 'BC1:count']
+        for start in ('2024-02-01', '2024-02-02'):
+            storage.upsert_partition(
+                path,
+                pd.DataFrame(
+                    {
+                        'timestamp': pd.date_range(start, periods=2),
+                        'BC1': pd.Series([1.5, 2.5], dtype='float32'),
+                        'BC1:count': [3, 4],
+                    },
+                ),
+                columns,
+            )
+        result = storage.read_partition(path)
+        self.assertEqual(result['BC1'].dtype, 'float32')
+        self.assertEqual(result['BC1:count'].dtype, 'int64')
+        self.assertEqual(result['BC1:count'].tolist(), [3, 3, 4])
+
+    def test_migrate_device(self):
+        self.assertEqual(storage.migrate_device('AE33'), 1)
+        self.assertEqual(
+            list(storage.list_partitions('AE33').values()),
+            [Path(self.path)],
+        )
+        df = storage.read_partition(self.path, ['BC2'])
+        self.assertEqual(df.columns.tolist(), ['timestamp', 'BC2'])
+        self.assertEqual(df['BC2'].tolist(), [10.0, 30.0])
+
+    def test_meta_built_from_legacy_csv(self):
+        meta = storage.load_meta('AE33')
+        self.assertEqual(meta['first'], '2024-01-01T00:00:00')
+        self.assertEqual(meta['last'], '2024-01-01T00:02:00')
+        self.assertEqual(meta['rows'], 2)
+        self.assertIsNone(meta['last_ingest'])
+
+    def test_meta_updated_on_write(self):
+        storage.load_meta('AE33')
+        storage.write_partition(
+            storage.partition_path('AE33', 2024, 2),
+            pd.DataFrame(
+                {
+                    'timestamp': pd.to_datetime(['2024-02-10 12:00']),
+                    'BC1': [1.0],
+                },
+            ),
+        )
+        storage.mark_ingested('AE33')
+        with mock.patch.object(storage, 'read_partition') as read_partition:
+            meta = storage.load_meta('AE33')
+        read_partition.assert_not_called()
+        self.assertEqual(meta['last'], '2024-02-10T12:00:00')
+        self.assertEqual(meta['rows'], 3)
+        self.assertIsNotNone(meta['last_ingest'])
+
+    def test_write_outside_proc_data(self):
+        with tempfile.TemporaryDirectory() as other:
+            path = Path(other, 'device', '2024_01.parquet')
+            path.parent.mkdir()
+            storage.write_partition(
+                path,
+                pd.DataFrame(
+                    {
+                        'timestamp': pd.to_datetime(['2024-01-05']),
+                        'BC1': [1.0],
+                    },
+                ),
+            )
+            meta = storage.read_meta_file(path.parent)
+        self.assertEqual(meta['last'], '2024-01-05T00:00:00')
+
+    def test_to_numeric_types(self):
+        df = storage.to_numeric(
+            pd.DataFrame(
+                {
+                    'BC1': ['861,233', '12,144', None],
+                    'Unix': [1714564800.5, 1714564801.5, 1714564802.5],
+                    'count': [1, 2, 3],
+                },
+            ),
+        )
+        self.assertEqual(df['BC1'].dtype, 'float32')
+        self.assertEqual(df['Unix'].dtype, 'float64')
+        self.assertEqual(df['count'].dtype, 'int64')
+        self.assertEqual(
+            df['BC1'].astype(str).tolist()[:2],
+            ['861.233', '12.144'],
+        )
+
+
+class TestPartitionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = storage.PartitionCache(2**20)
+        for name, value in (
+            ('proc_data_path', self.tmp_dir.name),
+            ('partition_cache', self.cache),
+        ):
+            patcher = mock.patch.object(storage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.path = storage.partition_path('AE33', 2024, 1)
+        storage.write_partition(self.path, self.make_month(1.0))
+        self.cache.clear()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_month(self, value, rows=10):
+        return pd.DataFrame(
+            {
+                'timestamp': pd.date_range('2024-01-01', periods=rows),
+                'BC1': [value] * rows,
+            },
+        )
+
+    def test_hits_and_misses(self):
+        storage.read_partition(self.path)
+        storage.read_partition(self.path, ['BC1'])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['entries'], 1)
+
+    def test_rewrite_replaces_entry(self):
+        storage.read_partition(self.path)
+        storage.write_partition(self.path, self.make_month(2.0))
+        with mock.patch.object(storage, 'decode_partition') as decode:
+            df = storage.read_partition(self.path)
+        decode.assert_not_called()
+        self.assertEqual(df['BC1'].tolist(), [2.0] * 10)
+
+    def test_changed_file_is_reread(self):
+        storage.read_partition(self.path)
+        storage.partition_cache = storage.PartitionCache(0)
+        storage.write_partition(self.path, self.make_month(3.0, rows=5))
+        storage.partition_cache = self.cache
+        df = storage.read_partition(self.path)
+        self.assertEqual(df['BC1'].tolist(), [3.0] * 5)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_result_is_a_copy(self):
+        storage.read_partition(self.path)['BC1'] = 0
+        self.assertEqual(
+            storage.read_partition(self.path)['BC1'].tolist(),
+            [1.0] * 10,
+        )
+
+    def test_eviction(self):
+        self.cache.max_bytes = 300
+        storage.read_partition(self.path)
+        storage.write_partition(
+            storage.partition_path('AE33', 2024, 2),
+            self.make_month(1.0),
+        )
+        stats = self.cache.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['evictions'], 1)
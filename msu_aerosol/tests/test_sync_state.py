@@ -0,0 +1,104 @@
+from datetime import datetime
+from pathlib import Path
+import tempfile
+import unittest
+
+from msu_aerosol.config import poll_max_interval
+from msu_aerosol.sync_state import SyncStateHandler
+
+__all__: list = []
+
+
+class TestSyncState(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.handler = SyncStateHandler(
+            str(Path(self.tmp_dir.name) / 'sync_state.json'),
+        )
+        self.file_path = Path(self.tmp_dir.name) / '2024_05.csv'
+        self.file_path.write_text('timestamp;BC\n')
+        self.item = {
+            'name': '2024_05.csv',
+            'modified': datetime(2024, 5, 1, 12, 0),
+            'size': 13,
+            'md5': 'abc',
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_new_device_is_changed(self):
+        self.assertFalse(
+            self.handler.is_unchanged('AE33', self.item, str(self.file_path)),
+        )
+
+    def test_processed_file_is_unchanged(self):
+        self.handler.update('AE33', self.item)
+        self.assertTrue(
+            self.handler.is_unchanged('AE33', self.item, str(self.file_path)),
+        )
+
+    def test_modified_file_is_changed(self):
+        self.handler.update('AE33', self.item)
+        item = dict(self.item, size=20, md5='def')
+        self.assertFalse(
+            self.handler.is_unchanged('AE33', item, str(self.file_path)),
+        )
+
+    def test_missing_local_file_is_changed(self):
+        self.handler.update('AE33', self.item)
+        self.file_path.unlink()
+        self.assertFalse(
+            self.handler.is_unchanged('AE33', self.item, str(self.file_path)),
+        )
+
+    def test_remove(self):
+        self.handler.update('AE33', self.item)
+        self.handler.remove('AE33')
+        self.assertEqual(self.handler.get('AE33'), {})
+
+    def test_offset_for_appended_file(self):
+        self.handler.update('AE33', self.item, str(self.file_path), 13)
+        with self.file_path.open('a') as f:
+            f.write('1714564800;1,5\n')
+        item = dict(self.item, size=28, md5='def')
+        self.assertEqual(
+            self.handler.get_offset('AE33', item, str(self.file_path)),
+            13,
+        )
+
+    def test_offset_for_rewritten_file(self):
+        self.handler.update('AE33', self.item, str(self.file_path), 13)
+        self.file_path.write_text('time;BC\n1714564800;1,5\n')
+        self.assertEqual(
+            self.handler.get_offset('AE33', self.item, str(self.file_path)),
+            0,
+        )
+
+    def test_offset_for_other_file(self):
+        self.handler.update('AE33', self.item, str(self.file_path), 13)
+        item = dict(self.item, name='2024_06.csv')
+        self.assertEqual(
+            self.handler.get_offset('AE33', item, str(self.file_path)),
+            0,
+        )
+
+    def test_interval_follows_cadence(self):
+        self.handler.update('AE33', self.item)
+        item = dict(self.item, modified=datetime(2024, 5, 1, 13, 0))
+        self.handler.update('AE33', item)
+        self.assertEqual(self.handler.next_interval('AE33', True), 1800)
+
+    def test_interval_backs_off_when_idle(self):
+        first = self.handler.next_interval('AE33', False)
+        second = self.handler.next_interval('AE33', False)
+        self.assertGreater(second, first)
+        for _ in range(50):
+            last = self.handler.next_interval('AE33', False)
+        self.assertEqual(last, poll_max_interval)
+
+    def test_archived_interval(self):
+        self.assertEqual(
+            self.handler.next_interval('AE33', True, archived=True),
+            poll_max_interval,
+        )
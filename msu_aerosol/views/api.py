@@ -0,0 +1,62 @@
+from flask import jsonify, request, Response
+from flask.views import MethodView
+from flask_login import login_required
+
+from msu_aerosol.exceptions import SeriesRequestError
+from msu_aerosol.models import Graph, Job
+from msu_aerosol.series import parse_max_points, parse_time, series_payload
+
+__all__: list = []
+
+
+class GraphSeries(MethodView):
+    """
+    Представление данных графика в формате JSON.
+    """
+
+    def get(self, graph_id: int) -> tuple[Response, int] | Response:
+        """
+        Метод GET, только он доступен.
+        Параметры запроса: start и end - границы промежутка (ISO 8601),
+        max_points - сколько точек оставить в каждой линии,
+        columns - столбцы через запятую, encoding - json или typed.
+
+        :param graph_id: Идентификатор графика
+        :return: Прореженные данные графика по столбцам
+        """
+
+        graph = Graph.query.get_or_404(graph_id)
+        columns = request.args.get('columns')
+        try:
+            payload = series_payload(
+                graph,
+                start=parse_time(request.args.get('start')),
+                end=parse_time(request.args.get('end')),
+                max_points=parse_max_points(request.args.get('max_points')),
+                columns=columns.split(',') if columns else None,
+                encoding=request.args.get('encoding', 'json'),
+            )
+        except SeriesRequestError as e:
+            return jsonify(error=str(e)), 400
+        except FileNotFoundError:
+            return jsonify(error='Нет данных прибора'), 404
+        return jsonify(payload)
+
+
+class JobStatus(MethodView):
+    """
+    Представление состояния фоновой задачи в формате JSON.
+    """
+
+    decorators = [login_required]
+
+    def get(self, job_id: int) -> Response:
+        """
+        Метод GET, только он доступен.
+
+        :param job_id: Идентификатор задачи
+        :return: Статус (queued, running, done, failed),
+                 доля выполненной работы и текущий шаг задачи
+        """
+
+        return jsonify(Job.query.get_or_404(job_id).to_dict())
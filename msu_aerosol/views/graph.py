@@ -16,8 +16,9 @@ from forms.file_form import FileForm
 from msu_aerosol.admin import get_complexes_dict
 from msu_aerosol.config import allowed_extensions, upload_folder
 from msu_aerosol.exceptions import FileExtensionError
-from msu_aerosol.graph_funcs import choose_range, preprocessing_one_file
-from msu_aerosol.graph_funcs import make_graph
+from msu_aerosol.fragments import find_compressed, find_fragment
+from msu_aerosol.graph_funcs import choose_range, make_graph
+from msu_aerosol.jobs import job_queue
 from msu_aerosol.models import Complex, Device, Graph
 
 __all__: list = []
@@ -30,13 +31,14 @@ def get_device_template(graph_id: int, **kwargs) -> str:
     передаём их в шаблон.
 
     :param graph_id: Идентификатор графика
-    :param kwargs: Словарь с ключами 'message' и 'error'
+    :param kwargs: Словарь с ключами 'message', 'error', 'form' и 'job'
     :return: Шаблон страницы прибора
     """
 
     message = kwargs.get('message')
     error = kwargs.get('error')
     form = kwargs.get('form')
+    job = kwargs.get('job')
     graph_orm_obj = Graph.query.get_or_404(graph_id)
     complex_orm_obj = Complex.query.get_or_404(graph_orm_obj.device.complex_id)
     complex_to_graphs = get_complexes_dict()
@@ -56,6 +58,7 @@ def get_device_template(graph_id: int, **kwargs) -> str:
         message=message,
         error=error,
         form=form,
+        job=job,
     )
 
 
@@ -105,17 +108,20 @@ class GraphPage(MethodView):
                     Path(directory, filename),
                 )
                 graph = Graph.query.get(graph_id)
-                preprocessing_one_file(
-                    graph,
-                    str(Path(directory) / filename),
-                    user_upload=True,
+                # Обработка файла и перерисовка графиков долгие,
+                # поэтому выполняются в фоновой задаче
+                job = job_queue.enqueue(
+                    'upload',
+                    device_id=graph.device_id,
+                    user_id=getattr(current_user, 'id', None),
+                    graph_id=graph.id,
+                    path=str(Path(directory) / filename),
                 )
-                make_graph(graph, 'full')
-                make_graph(graph, 'recent')
                 return get_device_template(
                     graph_id,
-                    message='Файл успешно получен',
+                    message='Файл успешно получен и поставлен в обработку',
                     form=form,
+                    job=job,
                 )
 
             except (Exception, FileExtensionError):
@@ -147,12 +153,14 @@ class GraphDownload(MethodView):
             request.form.get('datetime_picker_start'),
             request.form.get('datetime_picker_end'),
         )
+        resolution = request.form.get('resolution') or None
         graph = Graph.query.get(graph_id)
         buffer = make_graph(
             graph,
             'download',
             begin_record_date=data_range[0],
             end_record_date=data_range[1],
+            resolution=resolution,
         )
         with Path('download_log.log').open('a', encoding='utf-8') as log:
             log.write(
@@ -165,7 +173,40 @@ class GraphDownload(MethodView):
             buffer,
             as_attachment=True,
             attachment_filename=(
-                f'{graph.name}_{data_range[0]}-{data_range[1]}.csv'
+                f'{graph.name}_{data_range[0]}-{data_range[1]}'
+                f'{f"_{resolution}" if resolution else ""}.csv'
             ),
             mimetype='text/csv',
         )
+
+
+class GraphFragment(MethodView):
+    """
+    Представление отрисованного графика.
+    Браузер кэширует график и перепроверяет его по ETag и Last-Modified,
+    поэтому неизменившийся график повторно не передается.
+    Если браузер принимает сжатие, отдается заранее сжатая копия.
+    """
+
+    def get(self, graph_id: int, view: str) -> Response:
+        """
+        Метод GET, только он доступен.
+
+        :param graph_id: Идентификатор графика
+        :param view: Вид графика (full или recent)
+        :return: HTML графика
+        """
+
+        graph = Graph.query.get_or_404(graph_id)
+        path = find_fragment(graph.name, view)
+        if path is None:
+            abort(404)
+        accepted = [
+            value for value, quality in request.accept_encodings if quality > 0
+        ]
+        path, encoding = find_compressed(path, accepted)
+        response = send_file(path.resolve(), mimetype='text/html', max_age=0)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
@@ -8,6 +8,11 @@ from flask.views import MethodView
 from flask_login import current_user
 
 from msu_aerosol.admin import get_complexes_dict
+from msu_aerosol.config import (
+    homepage_prefetch,
+    homepage_sparklines,
+    lazy_graphs,
+)
 
 __all__: list = []
 ORDER_FILE = 'schema/block_order.json'
@@ -91,6 +96,9 @@ class Home(MethodView):
             view_name='homepage',
             complex_to_graphs=complex_to_graphs,
             user=current_user,
+            lazy_graphs=lazy_graphs,
+            prefetch=homepage_prefetch,
+            sparklines=homepage_sparklines,
         )
 
 